@@ -0,0 +1,270 @@
+"""
+Local stand-ins for every external service the pipeline talks to.
+
+Each fake answers like its real counterpart (same methods, same files on disk) without
+network access, after a configurable delay and with a configurable failure rate:
+    - FakeRedditPostExtractor: canned listings of synthetic posts (Reddit OAuth API)
+    - FakeVoiceGenerator: synthetic PCM and word timings (Cartesia TTS)
+    - FakeClipFetcher: synthetic footage generated once with ffmpeg (yt-dlp/YouTube)
+    - FakeSheetsLogger: in-memory rows (Google Sheets)
+    - FakeDropboxUploader: byte counting (Dropbox)
+"""
+
+import os
+import random
+import subprocess
+import threading
+import time
+import wave
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from helpers.reddit.redditPost import Post
+from helpers.uploaders.dropboxUploader import is_uploadable
+from helpers.uploaders.usedPostIndex import UsedPostIndex
+from helpers.video.wordTimings import WordTimings
+
+WORDS = (
+    "so my roommate decided to repaint the kitchen without asking anyone and now the whole "
+    "apartment smells like paint while the landlord keeps calling about the deposit we never "
+    "agreed to split because apparently that was my idea all along according to everyone else"
+).split()
+
+
+class FakeServiceError(Exception):
+    """Failure injected by a fake service."""
+
+
+class ServiceProfile:
+    def __init__(self, name: str, latency: float = 0.0, jitter: float = 0.0, failure_rate: float = 0.0, seed: Optional[int] = None):
+        """
+        Args:
+            name: Service name used in errors and stats
+            latency: Fixed delay of every call, in seconds
+            jitter: Extra uniformly random delay of up to this many seconds
+            failure_rate: Probability that a call raises FakeServiceError
+            seed: Seed for the delays and failures, for repeatable runs
+        """
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def call(self, extra_latency: float = 0.0):
+        with self._lock:
+            delay = self.latency + extra_latency + self.rng.uniform(0, self.jitter)
+            failed = self.rng.random() < self.failure_rate
+            self.calls += 1
+            self.failures += failed
+        time.sleep(delay)
+        if failed:
+            raise FakeServiceError(f"{self.name}: injected failure")
+
+
+class FakeRedditPostExtractor:
+    def __init__(self, profile: ServiceProfile, db_path: str, posts_per_subreddit: int = 100,
+                 words_per_post: Tuple[int, int] = (80, 160), seed: int = 0):
+        self.profile = profile
+        self.used_index = UsedPostIndex(db_path=db_path)
+        self.posts_per_subreddit = posts_per_subreddit
+        self.words_per_post = words_per_post
+        self.rng = random.Random(seed)
+        self.listings: Dict[str, List[Post]] = {}
+
+    def iter_top_posts_by_rating(self, subreddit: str, limit: int = 25, *filters, time_filter: str = 'day',
+                                 after: Optional[str] = None, lookahead: int = 0) -> Iterator[Post]:
+        yielded = 0
+        listing = self._listing(subreddit)
+        for i, post in enumerate(listing):
+            if yielded >= limit:
+                return
+            if i % 25 == 0:
+                self.profile.call()
+            if post.id in self.used_index:
+                continue
+            yielded += 1
+            yield post
+
+    def get_top_posts_by_rating(self, subreddit: str, limit: int = 25, *filters, **kwargs) -> List[Post]:
+        return list(self.iter_top_posts_by_rating(subreddit, limit))
+
+    def get_top_posts_multi(self, subreddits: List[str], limit: int = 25, *filters, time_filter: str = 'day',
+                            max_workers: int = 8) -> List[Post]:
+        posts = [post for subreddit in subreddits for post in self.iter_top_posts_by_rating(subreddit, limit)]
+        posts.sort(key=lambda post: post.score, reverse=True)
+        return posts[:limit]
+
+    def _listing(self, subreddit: str) -> List[Post]:
+        if subreddit not in self.listings:
+            self.listings[subreddit] = [self._post(subreddit, i) for i in range(self.posts_per_subreddit)]
+        return self.listings[subreddit]
+
+    def _post(self, subreddit: str, index: int) -> Post:
+        post_id = f"{subreddit[:3].lower()}{index:04d}"
+        body = " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(*self.words_per_post)))
+        return Post(
+            id=post_id, title=f"TIFU by benchmarking post {index} of r/{subreddit}", author="bench",
+            score=self.rng.randint(100, 50000), upvote_ratio=0.95, num_comments=self.rng.randint(10, 2000),
+            url=f"https://reddit.com/r/{subreddit}/comments/{post_id}", subreddit=subreddit, is_self=True,
+            selftext=body, domain=f"self.{subreddit}", over_18=False, spoiler=False, stickied=False,
+            permalink_path=f"/r/{subreddit}/comments/{post_id}/", created_timestamp=time.time(),
+        )
+
+
+class FakeVoiceGenerator:
+    def __init__(self, profile: ServiceProfile, words_per_second: float = 2.8, sample_rate: int = 44100):
+        self.profile = profile
+        self.words_per_second = words_per_second
+        self.sample_rate = sample_rate
+
+    def generate_audio(self, transcript: str, output_path: str):
+        words = transcript.split()
+        self.profile.call()
+
+        starts = [i / self.words_per_second for i in range(len(words))]
+        ends = [start + 0.8 / self.words_per_second for start in starts]
+        duration = len(words) / self.words_per_second + 0.5
+        t = np.arange(int(duration * self.sample_rate)) / self.sample_rate
+        pcm = (np.sin(2 * np.pi * 220 * t) * 3000).astype('<i2')
+
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        with wave.open(output_path, 'wb') as wav_file:
+            wav_file.setnchannels(1)
+            wav_file.setsampwidth(2)
+            wav_file.setframerate(self.sample_rate)
+            wav_file.writeframes(pcm.tobytes())
+        WordTimings(words, starts, ends).save(output_path.replace(".wav", ".words.json"))
+
+
+class FakeStreamResolver:
+    def invalidate(self, source_url: str):
+        pass
+
+
+class FakeClipFetcher:
+    """Drop-in for YtClipFetcher. Configure with `FakeClipFetcher.configure` before use."""
+    profile = ServiceProfile("footage")
+    footage_path: Optional[str] = None
+    footage_duration = 0.0
+
+    @classmethod
+    def configure(cls, profile: ServiceProfile, work_dir: str, duration: float = 180.0, size: str = "1080x1920"):
+        """Generate the synthetic footage every clip is cut from."""
+        cls.profile = profile
+        cls.footage_duration = duration
+        cls.footage_path = os.path.join(work_dir, "footage-source.mp4")
+        if not os.path.exists(cls.footage_path):
+            subprocess.run(
+                ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-f", "lavfi",
+                 "-i", f"testsrc2=size={size}:rate=30", "-t", str(duration),
+                 "-c:v", "libx264", "-preset", "ultrafast", "-g", "60", cls.footage_path],
+                check=True,
+            )
+
+    def __init__(self, output_path: str, url: Optional[str] = None, max_attempts: int = 3):
+        self.output_path = output_path
+        self.max_attempts = max_attempts
+        self.resolver = FakeStreamResolver()
+        self.source_url = None
+        self.video_stream_url = None
+
+    def resolve_clip_source(self, clip_duration: float, exclude: Optional[set] = None) -> Tuple[str, float, bool]:
+        self.profile.call()
+        self.source_url = "fake://footage"
+        start = random.uniform(0, max(self.footage_duration - clip_duration - 1, 0))
+        return self.footage_path, start, False
+
+    def fetch_clip(self, tiktok_crop: bool = False, clip_duration: Optional[int] = None, **kwargs):
+        source, start, _ = self.resolve_clip_source(clip_duration)
+        subprocess.run(
+            ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-ss", str(start), "-i", source,
+             "-t", str(clip_duration), "-c:v", "libx264", "-crf", "18", "-preset", "fast", "-an", self.output_path],
+            check=True,
+        )
+
+
+class FakeSheetsLogger:
+    def __init__(self, profile: ServiceProfile):
+        self.profile = profile
+        self.rows: List[list] = []
+        self.pending: List[list] = []
+        self._lock = threading.Lock()
+
+    def append_row(self, post_id: str, post_title: str, post_url: str, post_score: int):
+        with self._lock:
+            self.pending.append([post_id, post_title, post_url, post_score])
+
+    def pending_ids(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self.pending]
+
+    def flush(self) -> bool:
+        with self._lock:
+            rows, self.pending = self.pending, []
+        if rows:
+            self.profile.call()
+            self.rows.extend(rows)
+        return True
+
+    def get_ids_since(self, row_offset: int) -> List[str]:
+        return [row[0] for row in self.rows[row_offset:]]
+
+
+class FakeStreamingUpload:
+    def __init__(self, uploader: "FakeDropboxUploader", file_name: str):
+        self.uploader = uploader
+        self.file_name = file_name
+        self.size = 0
+
+    def write(self, data: bytes):
+        self.size += len(data)
+        self.uploader.profile.call(len(data) / self.uploader.bandwidth)
+
+    def finish(self):
+        self.uploader.profile.call()
+        self.uploader.uploaded[self.file_name] = self.size
+
+    def abort(self):
+        self.size = 0
+
+
+class FakeDropboxUploader:
+    def __init__(self, profile: ServiceProfile, bandwidth_mb: float = 50.0):
+        """
+        Args:
+            profile: Latency and failures of every request
+            bandwidth_mb: Simulated upload bandwidth in MB/s, added to the request latency
+        """
+        self.profile = profile
+        self.bandwidth = bandwidth_mb * 1024 * 1024
+        self.uploaded: Dict[str, int] = {}
+        self.chunk_size = 8 * 1024 * 1024
+
+    def upload_file(self, file_path: str, file_name: str):
+        size = os.path.getsize(file_path)
+        self.profile.call(size / self.bandwidth)
+        self.uploaded[file_name] = size
+
+    def batch_upload_files(self, folder_path: str) -> Dict[str, str]:
+        statuses = {}
+        for file_name in sorted(os.listdir(folder_path)):
+            if not is_uploadable(folder_path, file_name):
+                continue
+            size = os.path.getsize(os.path.join(folder_path, file_name))
+            if self.uploaded.get(file_name) == size:
+                statuses[file_name] = "skipped"
+                continue
+            try:
+                self.upload_file(os.path.join(folder_path, file_name), file_name)
+                statuses[file_name] = "uploaded"
+            except FakeServiceError:
+                statuses[file_name] = "failed"
+        return statuses
+
+    def open_stream(self, file_name: str) -> FakeStreamingUpload:
+        return FakeStreamingUpload(self, file_name)
@@ -0,0 +1,297 @@
+"""
+Micro-benchmarks of the CPU hot paths called once per frame or once per post.
+
+Every benchmark runs against generated inputs of increasing size, so a regression that
+only shows up on long posts or long videos is still caught. Results are written as JSON
+and can be compared against a stored baseline:
+
+    python -m benchmarks.micro_bench --font /path/to/font.ttf --save-baseline
+    python -m benchmarks.micro_bench --font /path/to/font.ttf --baseline benchmarks/micro_baseline.json
+
+Comparisons use the fastest repetition of each case, which is the least noisy on a shared
+machine. The exit status is 1 if any case got slower than the threshold.
+
+No baseline is committed, since timings only compare on similar hardware. Record one with
+`--save-baseline` on the machine that runs the checks, with every optional dependency
+installed so no case is skipped, and compare later runs on that machine against it.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from benchmarks.fakes import WORDS
+
+DEFAULT_BASELINE = os.path.join(project_root, "benchmarks", "micro_baseline.json")
+VIDEO_WIDTH = 1080
+VIDEO_HEIGHT = 1920
+FPS = 30
+
+BENCHMARKS: List[Tuple[str, Tuple[int, ...], str, Callable]] = []
+
+
+def benchmark(name: str, sizes: Tuple[int, ...], unit: str):
+    """Register `setup(size, ctx)`, which builds the input and returns the callable to time."""
+    def register(setup):
+        BENCHMARKS.append((name, sizes, unit, setup))
+        return setup
+    return register
+
+
+def words(count: int, rng: random.Random) -> List[str]:
+    return [rng.choice(WORDS) for _ in range(count)]
+
+
+def subtitle_clips(count: int, rng: random.Random):
+    from helpers.video.subtitleGenerator import SubtitleClip
+    clips, t = [], 0.0
+    for _ in range(count):
+        length = rng.uniform(1.0, 2.5)
+        clips.append(SubtitleClip(" ".join(words(rng.randint(3, 8), rng)), t, t + length))
+        t += length + rng.choice((0.0, 0.0, 0.3))
+    return clips
+
+
+def srt_time(seconds: float) -> str:
+    millis = int(round(seconds * 1000))
+    return f"{millis // 3600000:02d}:{millis // 60000 % 60:02d}:{millis // 1000 % 60:02d},{millis % 1000:03d}"
+
+
+@benchmark("wrap_title", (10, 40, 160), "words")
+def bench_wrap_title(size, ctx):
+    from PIL import ImageDraw
+    from helpers.reddit.formatRedditpost import ImageGenerator, load_font
+
+    generator = ImageGenerator(os.path.join(project_root, "public", "redditTemplate.png"))
+    font = load_font(ctx.font, 34)
+    draw = ImageDraw.Draw(generator.template.copy())
+    text = " ".join(words(size, ctx.rng))
+    return lambda: generator._draw_wrapped_text(draw, text, (50, 150), font, (0, 0, 0), 900)
+
+
+@benchmark("subtitle_render", (4, 8, 16), "words")
+def bench_subtitle_render(size, ctx):
+    from helpers.video.subtitleGenerator import SubtitleRenderer
+
+    renderer = SubtitleRenderer(VIDEO_WIDTH, VIDEO_HEIGHT, ctx.font)
+    text = " ".join(words(size, ctx.rng))
+    return lambda: renderer.render(text)
+
+
+@benchmark("overlay_get_frame", (5, 20, 60), "video seconds")
+def bench_overlay_get_frame(size, ctx):
+    from helpers.video.subtitleGenerator import SubtitleOverlay
+
+    subs = subtitle_clips(int(size / 1.5) + 1, ctx.rng)
+    times = [i / FPS for i in range(int(size * FPS))]
+
+    def run():
+        # A new overlay per run, so every subtitle is rendered once as in a real video.
+        overlay = SubtitleOverlay(subs, VIDEO_WIDTH, VIDEO_HEIGHT, ctx.font, initial_position_duration=2.0)
+        for t in times:
+            overlay.get_frame(t)
+    return run
+
+
+@benchmark("overlay_blend", (5, 20, 60), "video seconds")
+def bench_overlay_blend(size, ctx):
+    from helpers.video.subtitleGenerator import SubtitleOverlay
+
+    subs = subtitle_clips(int(size / 1.5) + 1, ctx.rng)
+    times = [i / FPS for i in range(int(size * FPS))]
+    frame = np.full((VIDEO_HEIGHT, VIDEO_WIDTH, 3), 96, dtype=np.uint8)
+
+    def run():
+        # Same per-frame work as make_frame_with_subtitles, minus decoding the source frame.
+        overlay = SubtitleOverlay(subs, VIDEO_WIDTH, VIDEO_HEIGHT, ctx.font, initial_position_duration=2.0)
+        for t in times:
+            overlay.blend(frame, t)
+    return run
+
+
+@benchmark("load_group_srt", (100, 1000, 10000), "entries")
+def bench_load_group_srt(size, ctx):
+    from helpers.video.subtitleGenerator import group_subtitles, load_srt
+
+    path = os.path.join(ctx.work_dir, f"bench-{size}.srt")
+    entries, t = [], 0.0
+    for i in range(size):
+        length = ctx.rng.uniform(0.8, 1.6)
+        entries.append(f"{i + 1}\n{srt_time(t)} --> {srt_time(t + length)}\n{' '.join(words(4, ctx.rng))}\n")
+        t += length + ctx.rng.choice((0.0, 0.0, 1.5))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(entries))
+    return lambda: group_subtitles(load_srt(path), max_words=8, max_gap=1.0)
+
+
+@benchmark("srt_from_timestamps", (100, 1000, 10000), "words")
+def bench_srt_from_timestamps(size, ctx):
+    from helpers.video.audioHandler import VoiceGenerator
+
+    # Only the SRT formatting is timed, so skip the constructor and its API key checks.
+    generator = VoiceGenerator.__new__(VoiceGenerator)
+    timestamps, t = [], 0.0
+    # Chunked TTS returns one timestamp list per chunk of about 200 words.
+    for offset in range(0, size, 200):
+        chunk = words(min(200, size - offset), ctx.rng)
+        starts = [t + i * 0.35 for i in range(len(chunk))]
+        timestamps.append({"words": chunk, "start": starts, "end": [start + 0.3 for start in starts]})
+        t = starts[-1] + 0.35
+    path = os.path.join(ctx.work_dir, "timestamps", f"bench-{size}.srt")
+
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            generator.generate_srt_from_timestamps(timestamps, path)
+    return run
+
+
+@benchmark("chunk_by_duration", (100, 1000, 10000), "transcript entries")
+def bench_chunk_by_duration(size, ctx):
+    from helpers.youtubeFetcher import YoutubeFetcher
+
+    # Only the chunking is timed: no API client, and the transcript is served from memory.
+    fetcher = YoutubeFetcher.__new__(YoutubeFetcher)
+    fetcher.max_duration = 30
+    fetcher.overlap_max = 5
+    entries, t = [], 0.0
+    for _ in range(size):
+        duration = ctx.rng.uniform(1.0, 4.0)
+        entries.append(SimpleNamespace(text=" ".join(words(8, ctx.rng)), start=t, duration=duration))
+        t += duration
+    fetcher.fetch_transcript = lambda: entries
+    return fetcher.chunk_by_duration
+
+
+def measure(fn: Callable, repeat: int) -> Dict[str, float]:
+    """Seconds per call: calibrated like `python -m timeit`, then repeated `repeat` times."""
+    fn()
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    runs = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {"min": min(runs), "median": statistics.median(runs), "max": max(runs), "calls": number, "repeat": repeat}
+
+
+def run(args) -> Dict:
+    ctx = SimpleNamespace(font=args.font, rng=None, work_dir=tempfile.mkdtemp(prefix="tokbot-micro-"))
+    results = {}
+    for name, sizes, unit, setup in BENCHMARKS:
+        if args.filter and not any(pattern in name for pattern in args.filter):
+            continue
+        for size in sizes[:2] if args.quick else sizes:
+            key = f"{name}[{size}]"
+            ctx.rng = random.Random(f"{args.seed}-{key}")
+            try:
+                fn = setup(size, ctx)
+            except ImportError as e:
+                results[key] = {"skipped": f"missing dependency: {e.name}"}
+                print(f"{key:<32} skipped ({results[key]['skipped']})")
+                continue
+            results[key] = {"size": size, "unit": unit, **measure(fn, args.repeat)}
+            print(f"{key:<32} {format_seconds(results[key]['min']):>10} per call ({size} {unit})")
+
+    return {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "cpu": cpu_model(),
+            "cpu_count": os.cpu_count(),
+            "numpy": np.__version__,
+            "font": os.path.basename(args.font),
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+
+
+def cpu_model() -> str:
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or "unknown"
+
+
+def compare(report: Dict, baseline: Dict, threshold: float) -> List[str]:
+    """Print current vs. baseline for every case measured in both, and return the regressions."""
+    regressions = []
+    for field in ("machine", "cpu", "python"):
+        if baseline.get("meta", {}).get(field) != report["meta"][field]:
+            print(f"Warning: baseline was recorded with {field} {baseline.get('meta', {}).get(field)}, "
+                  f"this run uses {report['meta'][field]}")
+    print(f"\n{'case':<32}{'baseline':>11}{'current':>11}{'change':>9}")
+    for key, current in report["results"].items():
+        previous = baseline.get("results", {}).get(key)
+        if "min" not in current or not previous or "min" not in previous:
+            continue
+        change = current["min"] / previous["min"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(key)
+            flag = "  REGRESSION"
+        print(f"{key:<32}{format_seconds(previous['min']):>11}{format_seconds(current['min']):>11}{change:>+9.1%}{flag}")
+    return regressions
+
+
+def format_seconds(seconds: float) -> str:
+    if seconds >= 1:
+        return f"{seconds:.2f}s"
+    if seconds >= 1e-3:
+        return f"{seconds * 1e3:.2f}ms"
+    return f"{seconds * 1e6:.1f}us"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the CPU hot paths.")
+    parser.add_argument("--font", default=os.getenv("SUBTITLE_FONT_PATH"), help="TrueType font for cards and subtitles")
+    parser.add_argument("--filter", action="append", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--quick", action="store_true", help="Skip the largest input of every benchmark")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed repetitions of every case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the results as JSON to this path")
+    parser.add_argument("--baseline", help="Compare against results saved earlier")
+    parser.add_argument("--save-baseline", nargs="?", const=DEFAULT_BASELINE, metavar="PATH",
+                        help=f"Save the results as the new baseline (default: {os.path.relpath(DEFAULT_BASELINE, project_root)})")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Slowdown reported as a regression, as a fraction")
+    args = parser.parse_args()
+
+    if not args.font:
+        parser.error("--font or SUBTITLE_FONT_PATH is required to render subtitles")
+
+    report = run(args)
+
+    for path in filter(None, (args.output, args.save_baseline)):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} cases slower than the baseline by more than {args.threshold:.0%}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Offline end-to-end benchmark of RedditGenerator.
+
+Runs the full fetch -> card -> TTS -> render -> upload flow against the local fakes in
+`benchmarks/fakes.py`. Real work is still done: the title cards are drawn and the videos
+are encoded with ffmpeg. Only the network services are replaced. Reports videos per hour,
+per-stage latency percentiles (from the job store) and peak RSS.
+
+    python -m benchmarks.pipeline_bench --posts 10 --font /path/to/font.ttf
+    python -m benchmarks.pipeline_bench --mode pipeline --latency tts=2 --failure-rate footage=0.1
+"""
+
+import argparse
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_root)
+
+from benchmarks.fakes import (FakeClipFetcher, FakeDropboxUploader, FakeRedditPostExtractor, FakeSheetsLogger,
+                              FakeVoiceGenerator, ServiceProfile)
+
+SERVICES = ("reddit", "tts", "footage", "sheets", "dropbox")
+DEFAULT_LATENCY = {"reddit": 0.3, "tts": 1.5, "footage": 0.5, "sheets": 0.3, "dropbox": 0.2}
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    return {"count": len(ordered), "p50": pick(50), "p90": pick(90), "p99": pick(99), "max": ordered[-1]}
+
+
+def peak_rss_mb(who: int) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def parse_overrides(values: List[str], option: str) -> Dict[str, float]:
+    overrides = {}
+    for value in values:
+        service, _, number = value.partition("=")
+        if service not in SERVICES or not number:
+            raise SystemExit(f"{option} expects SERVICE=NUMBER with SERVICE one of {', '.join(SERVICES)}, got {value!r}")
+        overrides[service] = float(number)
+    return overrides
+
+
+def run(args) -> Dict:
+    latency = {**DEFAULT_LATENCY, **parse_overrides(args.latency, "--latency")}
+    failure_rate = {service: args.failure_rate_all for service in SERVICES}
+    failure_rate.update(parse_overrides(args.failure_rate, "--failure-rate"))
+    profiles = {
+        service: ServiceProfile(service, latency[service], latency[service] * args.jitter, failure_rate[service], seed=args.seed + i)
+        for i, service in enumerate(SERVICES)
+    }
+
+    work_dir = os.path.abspath(args.work_dir or tempfile.mkdtemp(prefix="tokbot-bench-"))
+    os.makedirs(work_dir, exist_ok=True)
+    subreddits = [f"bench{i}" for i in range(args.subreddits)]
+    os.environ.update({
+        "STORYTELLING_SUBREDDITS": ",".join(subreddits),
+        "VIRAL_POST_LIMIT": str(args.posts),
+        "VIRAL_MIN_SCORE": "0",
+        "VIRAL_MIN_RATIO": "0",
+        "VIRAL_MIN_COMMENTS": "0",
+        "VIRAL_MIN_BODY_LENGTH": "0",
+        "VIRAL_MAX_BODY_LENGTH": "100000",
+        "FINAL_VIDEO_PATH": "final_vids/",
+        "SINGLE_PASS_RENDER": "true" if args.render == "single-pass" else "false",
+        "STAGED_PIPELINE": "true" if args.mode == "pipeline" else "false",
+        "STREAM_UPLOAD": "true" if args.stream_upload else "false",
+    })
+    if args.font:
+        os.environ["SUBTITLE_FONT_PATH"] = os.environ["TITLE_FONT_PATH"] = os.environ["SUBREDDIT_FONT_PATH"] = args.font
+
+    # Imported after the environment is set up, since some modules read it at import time.
+    from generators.redditGenerator import RedditGenerator
+    from helpers.jobStore import JobStore
+    from helpers.reddit.formatRedditpost import ImageGenerator
+    from helpers.retryPolicy import RetryPolicy
+    from helpers.video import singlePassRender, videoEditor
+
+    FakeClipFetcher.configure(profiles["footage"], work_dir, duration=args.footage_seconds)
+    singlePassRender.YtClipFetcher = FakeClipFetcher
+    videoEditor.YtClipFetcher = FakeClipFetcher
+
+    os.chdir(work_dir)
+    os.makedirs("final_vids", exist_ok=True)
+    job_store = JobStore(os.path.join(work_dir, f"jobs-{time.time_ns()}.db"))
+    generator = RedditGenerator(
+        reddit_fetcher=FakeRedditPostExtractor(profiles["reddit"], os.path.join(work_dir, f"used-{time.time_ns()}.db"),
+                                               words_per_post=(args.min_words, args.max_words), seed=args.seed),
+        image_generator=ImageGenerator(os.path.join(project_root, "public", "redditTemplate.png")),
+        sheets_logger=FakeSheetsLogger(profiles["sheets"]),
+        voice_generator=FakeVoiceGenerator(profiles["tts"]),
+        dropbox_uploader=FakeDropboxUploader(profiles["dropbox"]),
+        job_store=job_store,
+    )
+    generator.footage_retry_policy = RetryPolicy(max_attempts=4, base_delay=0.5, max_delay=2.0)
+
+    started = time.perf_counter()
+    generator.fetch_reddit_posts()
+    generator.upload_to_tiktok()
+    elapsed = time.perf_counter() - started
+
+    counts = job_store.counts()
+    rendered = counts["rendered"] + counts["uploaded"]
+    return {
+        "config": {
+            "posts": args.posts, "mode": args.mode, "render": args.render, "stream_upload": args.stream_upload,
+            "latency": latency, "failure_rate": failure_rate, "jitter": args.jitter, "seed": args.seed,
+        },
+        "elapsed_seconds": elapsed,
+        "videos": rendered,
+        "videos_per_hour": rendered / elapsed * 3600 if elapsed else 0.0,
+        "jobs": counts,
+        "failed_jobs": [{"post_id": job.post_id, "stage": job.stage, "error": job.error} for job in job_store.failed()],
+        "stages": {stage: percentiles(values) for stage, values in job_store.timings().items() if values},
+        "services": {name: {"calls": p.calls, "failures": p.failures} for name, p in profiles.items()},
+        "peak_rss_mb": {"self": peak_rss_mb(resource.RUSAGE_SELF), "children": peak_rss_mb(resource.RUSAGE_CHILDREN)},
+        "work_dir": work_dir,
+    }
+
+
+def print_report(report: Dict):
+    config = report["config"]
+    print(f"\n{report['videos']} videos in {report['elapsed_seconds']:.1f}s "
+          f"({report['videos_per_hour']:.1f} videos/hour, mode={config['mode']}, render={config['render']})")
+    print(f"{'stage':<10}{'count':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for stage, stats in report["stages"].items():
+        print(f"{stage:<10}{stats['count']:>7}{stats['p50']:>9.2f}{stats['p90']:>9.2f}{stats['p99']:>9.2f}{stats['max']:>9.2f}")
+    services = ", ".join(f"{name} {s['calls']} calls/{s['failures']} failed" for name, s in report["services"].items())
+    print(f"services: {services}")
+    print(f"peak RSS: {report['peak_rss_mb']['self']:.0f} MB (python), {report['peak_rss_mb']['children']:.0f} MB (largest child)")
+    if report["failed_jobs"]:
+        print(f"{len(report['failed_jobs'])} jobs with errors")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of RedditGenerator.")
+    parser.add_argument("--posts", type=int, default=10, help="Number of videos to produce")
+    parser.add_argument("--subreddits", type=int, default=2)
+    parser.add_argument("--min-words", type=int, default=80)
+    parser.add_argument("--max-words", type=int, default=160)
+    parser.add_argument("--mode", choices=["sequential", "pipeline"], default="sequential")
+    parser.add_argument("--render", choices=["single-pass", "moviepy"], default="single-pass")
+    parser.add_argument("--stream-upload", action="store_true")
+    parser.add_argument("--latency", action="append", default=[], metavar="SERVICE=SECONDS",
+                        help=f"Per-call latency of a fake service ({', '.join(SERVICES)})")
+    parser.add_argument("--failure-rate", action="append", default=[], metavar="SERVICE=RATE",
+                        help="Probability that a call to a fake service fails")
+    parser.add_argument("--failure-rate-all", type=float, default=0.0, help="Failure rate of every service")
+    parser.add_argument("--jitter", type=float, default=0.2, help="Random extra latency, as a fraction of the latency")
+    parser.add_argument("--footage-seconds", type=float, default=180.0, help="Length of the synthetic footage")
+    parser.add_argument("--font", default=os.getenv("SUBTITLE_FONT_PATH"), help="TrueType font for cards and subtitles")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--work-dir", help="Directory for generated files (default: a new temporary directory)")
+    parser.add_argument("--output", help="Write the report as JSON to this path")
+    args = parser.parse_args()
+
+    if not args.font:
+        parser.error("--font or SUBTITLE_FONT_PATH is required to render subtitles")
+    args.font = os.path.abspath(args.font)
+    output = os.path.abspath(args.output) if args.output else None
+
+    report = run(args)
+    print_report(report)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,76 +5,301 @@ project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, project_root)
 
 from helpers.reddit.redditFetcher import RedditPostExtractor
+from helpers.reddit.redditPost import Post
 from helpers.reddit.formatRedditpost import ImageGenerator
-from helpers.uploaders.sheetsLogger import SheetsLogger
+from helpers.uploaders.sheetsLogger import BufferedSheetsLogger
 from helpers.video.audioHandler import VoiceGenerator
 from helpers.video.videoEditor import VideoCompiler
 from helpers.video.subtitleGenerator import add_subtitles
+from helpers.video.singlePassRender import render_video
 from helpers.uploaders.dropboxUploader import DropboxUploader
+from helpers.video.footageFetcher import FootageFetchError
+from helpers.retryPolicy import RetryPolicy
+from helpers.pipeline import Pipeline, PipelineResult, Stage
+from helpers.jobStore import Job, JobStore
+import collections
+import functools
+import heapq
+import itertools
+import time
 import tqdm
+from typing import List, Optional, Tuple
 
 
 class RedditGenerator:
-    def __init__(self):
-        self.reddit_fetcher = RedditPostExtractor()
-        self.image_generator = ImageGenerator()
-        self.sheets_logger = SheetsLogger()
-        self.voice_generator = VoiceGenerator()
+    def __init__(self, reddit_fetcher: Optional[RedditPostExtractor] = None, image_generator: Optional[ImageGenerator] = None,
+                 sheets_logger: Optional[BufferedSheetsLogger] = None, voice_generator: Optional[VoiceGenerator] = None,
+                 dropbox_uploader: Optional[DropboxUploader] = None, job_store: Optional[JobStore] = None):
+        """
+        Every client is created from the environment unless one is passed in, e.g. a local
+        stand-in from `benchmarks/fakes.py`.
+        """
+        self.sheets_logger = sheets_logger or BufferedSheetsLogger()
+        self.reddit_fetcher = reddit_fetcher or RedditPostExtractor(sheets_logger=self.sheets_logger)
+        self.image_generator = image_generator or ImageGenerator()
+        self.voice_generator = voice_generator or VoiceGenerator()
         self.STORYTELLING_SUBREDDITS = list(os.getenv("STORYTELLING_SUBREDDITS").split(","))
         self.VIRAL_POST_LIMIT = int(os.getenv("VIRAL_POST_LIMIT"))
         self.VIRAL_MIN_SCORE = int(os.getenv("VIRAL_MIN_SCORE"))
         self.VIRAL_MIN_RATIO = float(os.getenv("VIRAL_MIN_RATIO"))
         self.VIRAL_MIN_COMMENTS = int(os.getenv("VIRAL_MIN_COMMENTS"))
-        self.VIRAL_TIME_FILTER = os.getenv("VIRAL_TIME_FILTER")
+        self.VIRAL_TIME_FILTER = os.getenv("VIRAL_TIME_FILTER", "day")
         self.VIRAL_MIN_BODY_LENGTH = int(os.getenv("VIRAL_MIN_BODY_LENGTH"))
         self.VIRAL_MAX_BODY_LENGTH = int(os.getenv("VIRAL_MAX_BODY_LENGTH"))
-        self.dropbox_uploader = DropboxUploader()
+        self.REDDIT_FETCH_WORKERS = int(os.getenv("REDDIT_FETCH_WORKERS", "1"))
+        self.VIRAL_LOOKAHEAD = int(os.getenv("VIRAL_LOOKAHEAD", "0"))
+        self.SINGLE_PASS_RENDER = os.getenv("SINGLE_PASS_RENDER", "false").lower() == "true"
+        self.STAGED_PIPELINE = os.getenv("STAGED_PIPELINE", "false").lower() == "true"
+        self.PIPELINE_PREPARE_WORKERS = int(os.getenv("PIPELINE_PREPARE_WORKERS", "4"))
+        self.PIPELINE_RENDER_WORKERS = int(os.getenv("PIPELINE_RENDER_WORKERS", "2"))
+        self.STREAM_UPLOAD = self.SINGLE_PASS_RENDER and os.getenv("STREAM_UPLOAD", "false").lower() == "true"
+        self.footage_retry_policy = RetryPolicy(max_attempts=4, base_delay=15.0, max_delay=120.0)
+        self.dropbox_uploader = dropbox_uploader or DropboxUploader()
+        self.job_store = job_store or JobStore()
     def fetch_reddit_posts(self):
-        for subreddit in tqdm.tqdm(self.STORYTELLING_SUBREDDITS):
-            output_folders = [folder for folder in os.listdir(".") if folder.startswith("output-") and os.path.isdir(folder)]
-            if len(output_folders) >= self.VIRAL_POST_LIMIT:
-                print(f"Already have {len(output_folders)} posts, skipping fetch")
-                break
-            
-            posts = self.reddit_fetcher.get_top_posts_by_rating(subreddit, self.VIRAL_POST_LIMIT - len(output_folders), self.VIRAL_MIN_SCORE, self.VIRAL_MIN_RATIO, self.VIRAL_MIN_COMMENTS, self.VIRAL_MIN_BODY_LENGTH, self.VIRAL_MAX_BODY_LENGTH)
-            for post in posts:
-                _, post_title = self.image_generator.add_text_to_image(post["subreddit"], post["title"], f"output-{post['id']}/reddit.png")
-                self.voice_generator.generate_audio(post["selftext"], f"output-{post['id']}/audio.wav")
-                with open(f"output-{post['id']}/title.txt", "w") as f:
-                    f.write(post_title)
-                self.sheets_logger.append_row(post["id"], post["title"], post["url"], post["score"])
-                
-        output_folders = [folder for folder in os.listdir(".") if folder.startswith("output-") and os.path.isdir(folder)]
-        output_folders.sort()
+        if self.STAGED_PIPELINE:
+            self.run_pipeline()
+            return
         
-        compiled_count = 0
-        for folder in output_folders:
-            if compiled_count >= self.VIRAL_POST_LIMIT:
-                break
+        in_progress = self.resume_jobs()
+        remaining = self.VIRAL_POST_LIMIT - len(in_progress)
+        
+        if remaining <= 0:
+            print(f"Already have {len(in_progress)} posts, skipping fetch")
+        elif self.REDDIT_FETCH_WORKERS > 1:
+            self.fetch_posts_parallel(remaining)
+        else:
+            for subreddit in tqdm.tqdm(self.STORYTELLING_SUBREDDITS):
+                if remaining <= 0:
+                    break
                 
-            folder_path = folder
-            compiled_video_path = os.path.join(folder_path, "compiled.mp4")
-            
-            if not os.path.exists(compiled_video_path):
+                posts = self.reddit_fetcher.iter_top_posts_by_rating(subreddit, remaining, self.VIRAL_MIN_SCORE, self.VIRAL_MIN_RATIO, self.VIRAL_MIN_COMMENTS, self.VIRAL_MIN_BODY_LENGTH, self.VIRAL_MAX_BODY_LENGTH, time_filter=self.VIRAL_TIME_FILTER, lookahead=self.VIRAL_LOOKAHEAD)
+                for post in posts:
+                    self.prepare_post(post)
+                    remaining -= 1
+        
+        self.sheets_logger.flush()
+        
+        self.compile_videos([job.folder for job in self.job_store.pending(before="rendered") if job.reached("voiced")])
+    
+    def resume_jobs(self) -> List[Job]:
+        """
+        Finish preparing jobs that stopped before their narration was saved, picking each
+        one up at its next stage. Output folders from before the job store are registered
+        first.
+        
+        Returns:
+            Jobs that are not rendered yet
+        """
+        self.job_store.backfill()
+        in_progress = self.job_store.pending(before="rendered")
+        for job in in_progress:
+            if not job.reached("voiced"):
+                print(f"Resuming {job.post_id} after stage {job.stage}")
                 try:
-                    video_compiler = VideoCompiler(folder_path + "/", compiled_video_path)
-                    video_compiler.fetch_footage()
-                    video_compiler.compile_video()
-                    add_subtitles(folder_path + "/", f"{os.getenv('FINAL_VIDEO_PATH')}reddit-{folder.split('-')[1]}.mp4")
-                    compiled_count += 1
-                    self.delete_reddit_files(folder_path)
+                    self.prepare_post(job.post)
                 except Exception as e:
-                    print(f"Error compiling video for {folder}: {e}")
-                    continue
+                    print(f"Error preparing {job.post_id}: {e}")
+        return in_progress
+    
+    def compile_videos(self, output_folders: list):
+        """
+        Compile output folders into final videos. A folder whose footage could not be
+        fetched is rescheduled with jittered backoff while the other folders keep rendering.
+        """
+        pending = collections.deque(output_folders)
+        deferred = []
+        attempts = collections.Counter()
+        sequence = itertools.count()
+        compiled_count = 0
+        
+        while (pending or deferred) and compiled_count < self.VIRAL_POST_LIMIT:
+            if not pending:
+                ready_at, _, folder = heapq.heappop(deferred)
+                wait = ready_at - time.monotonic()
+                if wait > 0:
+                    print(f"Waiting {wait:.0f}s before retrying footage for {folder}")
+                    time.sleep(wait)
             else:
+                folder = pending.popleft()
+            
+            try:
+                self.compile_folder(folder)
                 compiled_count += 1
+            except FootageFetchError as e:
+                attempts[folder] += 1
+                if self.footage_retry_policy.can_retry(attempts[folder]):
+                    delay = self.footage_retry_policy.delay(attempts[folder])
+                    print(f"Footage unavailable for {folder}, retrying in {delay:.0f}s: {e}")
+                    heapq.heappush(deferred, (time.monotonic() + delay, next(sequence), folder))
+                else:
+                    print(f"Giving up on {folder} after {attempts[folder]} footage attempts: {e}")
+            except Exception as e:
+                print(f"Error compiling video for {folder}: {e}")
+                continue
+            
+            while deferred and deferred[0][0] <= time.monotonic():
+                pending.append(heapq.heappop(deferred)[2])
+    
+    def compile_folder(self, folder: str):
+        post_id = folder.split('-')[1]
+        job = self.job_store.get(post_id)
+        
+        try:
+            if not self.SINGLE_PASS_RENDER and not (job and job.reached("footage")):
+                started = time.perf_counter()
+                footage_path = fetch_folder_footage(folder)
+                self.job_store.advance(post_id, "footage", {"footage": footage_path}, time.perf_counter() - started)
+            
+            _, final_video_path, seconds = render_folder(folder, self.SINGLE_PASS_RENDER, self.stream_uploader())
+        except Exception as e:
+            self.job_store.fail(post_id, "rendered", e)
+            raise
+        
+        self.finish_render(folder, final_video_path, seconds)
+    
+    def finish_render(self, folder: str, final_video_path: str, seconds: float):
+        post_id = folder.split('-')[1]
+        self.job_store.advance(post_id, "rendered", {"video": final_video_path}, seconds)
+        if self.STREAM_UPLOAD:
+            self.job_store.advance(post_id, "uploaded")
+        self.delete_reddit_files(folder)
+    
+    def stream_uploader(self):
+        """Uploader the single-pass render streams to, or None to only write locally."""
+        return self.dropbox_uploader if self.STREAM_UPLOAD else None
+    
+    def run_pipeline(self) -> PipelineResult:
+        """
+        Fetch, prepare and render posts as a staged pipeline, so posts are fetched, carded
+        and voiced while earlier posts are still rendering. Unfinished jobs from earlier
+        runs go first, including output folders from before the job store.
+        """
+        self.job_store.backfill()
+        in_progress = self.job_store.pending(before="rendered")
+        remaining = max(self.VIRAL_POST_LIMIT - len(in_progress), 0)
+        
+        def posts():
+            yield from (job.post for job in in_progress)
+            yield from itertools.islice(self.iter_posts(), remaining)
+        
+        def prepare(post: Post):
+            self.prepare_post(post)
+            return f"output-{post.id}"
+        
+        def finish(rendered):
+            self.finish_render(*rendered)
+            return rendered[0]
+        
+        # The single-pass render encodes in an ffmpeg subprocess, so threads are enough;
+        # the moviepy path renders in Python and needs processes.
+        render_kind = "thread" if self.SINGLE_PASS_RENDER else "process"
+        pipeline = Pipeline([
+            Stage("prepare", prepare, workers=self.PIPELINE_PREPARE_WORKERS),
+            Stage("render", functools.partial(render_folder, single_pass_render=self.SINGLE_PASS_RENDER, uploader=self.stream_uploader()),
+                  workers=self.PIPELINE_RENDER_WORKERS, kind=render_kind),
+            Stage("finish", finish),
+        ])
+        
+        try:
+            result = pipeline.run(itertools.islice(posts(), self.VIRAL_POST_LIMIT))
+        finally:
+            self.sheets_logger.flush()
+        
+        for stage, item, error in result.failures:
+            if stage == "render":
+                self.job_store.fail(item.split('-')[1], "rendered", error)
+        print(result.summary())
+        return result
+    
+    def iter_posts(self):
+        """Qualified posts of every subreddit, streamed as they are found."""
+        if self.REDDIT_FETCH_WORKERS > 1:
+            yield from self.reddit_fetcher.get_top_posts_multi(self.STORYTELLING_SUBREDDITS, self.VIRAL_POST_LIMIT, self.VIRAL_MIN_SCORE, self.VIRAL_MIN_RATIO, self.VIRAL_MIN_COMMENTS, self.VIRAL_MIN_BODY_LENGTH, self.VIRAL_MAX_BODY_LENGTH, time_filter=self.VIRAL_TIME_FILTER, max_workers=self.REDDIT_FETCH_WORKERS)
+            return
+        for subreddit in self.STORYTELLING_SUBREDDITS:
+            yield from self.reddit_fetcher.iter_top_posts_by_rating(subreddit, self.VIRAL_POST_LIMIT, self.VIRAL_MIN_SCORE, self.VIRAL_MIN_RATIO, self.VIRAL_MIN_COMMENTS, self.VIRAL_MIN_BODY_LENGTH, self.VIRAL_MAX_BODY_LENGTH, time_filter=self.VIRAL_TIME_FILTER, lookahead=self.VIRAL_LOOKAHEAD)
+    
+    def fetch_posts_parallel(self, limit: int):
+        posts = self.reddit_fetcher.get_top_posts_multi(self.STORYTELLING_SUBREDDITS, limit, self.VIRAL_MIN_SCORE, self.VIRAL_MIN_RATIO, self.VIRAL_MIN_COMMENTS, self.VIRAL_MIN_BODY_LENGTH, self.VIRAL_MAX_BODY_LENGTH, time_filter=self.VIRAL_TIME_FILTER, max_workers=self.REDDIT_FETCH_WORKERS)
+        for post in tqdm.tqdm(posts):
+            self.prepare_post(post)
+    
+    def prepare_post(self, post: Post):
+        """
+        Render the title card and narration of a post. Stages the job store has already
+        recorded for the post are skipped, so a resumed post never pays for its TTS twice.
+        """
+        job = self.job_store.add(post)
+        folder = f"output-{post.id}"
+        stage = "carded"
+        
+        try:
+            if not job.reached("carded"):
+                started = time.perf_counter()
+                _, post_title = self.image_generator.add_text_to_image(post.subreddit, post.title, f"{folder}/reddit.png")
+                with open(f"{folder}/title.txt", "w") as f:
+                    f.write(post_title)
+                self.job_store.advance(post.id, "carded", {"card": f"{folder}/reddit.png", "title": f"{folder}/title.txt"}, time.perf_counter() - started)
+            
+            stage = "voiced"
+            if not job.reached("voiced"):
+                started = time.perf_counter()
+                self.voice_generator.generate_audio(post.selftext, f"{folder}/audio.wav")
+                self.sheets_logger.append_row(post.id, post.title, post.url, post.score)
+                self.reddit_fetcher.used_index.add(post.id)
+                self.job_store.advance(post.id, "voiced", {"audio": f"{folder}/audio.wav"}, time.perf_counter() - started)
+        except Exception as e:
+            self.job_store.fail(post.id, stage, e)
+            raise
     
     def upload_to_tiktok(self):
-        self.dropbox_uploader.batch_upload_files(f"final_vids")
+        statuses = self.dropbox_uploader.batch_upload_files(f"final_vids")
+        for job in self.job_store.at_stage("rendered"):
+            if statuses.get(os.path.basename(job.artifacts.get("video", ""))) in ("uploaded", "skipped"):
+                self.job_store.advance(job.post_id, "uploaded")
     
 
     def delete_reddit_files(self, folder_path: str):
         for file in os.listdir(folder_path):
             os.remove(f"{folder_path}/{file}")
         os.rmdir(folder_path)
-        
+
+
+def fetch_folder_footage(folder: str) -> str:
+    """Cut the background footage of an output folder for the moviepy render path."""
+    video_compiler = VideoCompiler(folder + "/", os.path.join(folder, "compiled.mp4"))
+    video_compiler.fetch_footage()
+    return os.path.join(folder, "footage.mp4")
+
+
+def render_folder(folder: str, single_pass_render: bool = False, uploader: Optional[DropboxUploader] = None) -> Tuple[str, str, float]:
+    """
+    Render an output folder into its final video. Module-level so pipeline render stages
+    can run it in worker processes.
+    
+    Args:
+        folder: Output folder of the post
+        single_pass_render: Render with one ffmpeg encode instead of the moviepy path
+        uploader: Stream the single-pass render to Dropbox while it is encoded
+                  (keeps a local copy unless STREAM_UPLOAD_KEEP_LOCAL=false)
+    
+    Returns:
+        Tuple of (folder, final video path, seconds taken)
+    """
+    started = time.perf_counter()
+    final_video_path = f"{os.getenv('FINAL_VIDEO_PATH')}reddit-{folder.split('-')[1]}.mp4"
+    
+    if single_pass_render:
+        keep_local = os.getenv("STREAM_UPLOAD_KEEP_LOCAL", "true").lower() == "true"
+        render_video(folder + "/", final_video_path, uploader=uploader, keep_local=keep_local)
+        return folder, final_video_path, time.perf_counter() - started
+    
+    compiled_video_path = os.path.join(folder, "compiled.mp4")
+    
+    if not os.path.exists(os.path.join(folder, "footage.mp4")):
+        fetch_folder_footage(folder)
+    if not os.path.exists(compiled_video_path):
+        VideoCompiler(folder + "/", compiled_video_path).compile_video()
+    add_subtitles(folder + "/", final_video_path)
+    return folder, final_video_path, time.perf_counter() - started
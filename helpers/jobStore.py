@@ -0,0 +1,254 @@
+"""
+Persistent state of every post's trip through the pipeline.
+
+Each job records the last stage a post completed, the artifacts produced along the way
+(card, narration, footage, final video), how long each stage took and the last error.
+A restarted run reads its work from here instead of scanning `output-*` folders, and picks
+every job up at the stage after the one it completed, so paid calls (TTS) are never
+repeated for a post that already has its narration.
+
+Stages, in order: fetched, carded, voiced, footage, rendered, uploaded.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from helpers.reddit.redditPost import Post
+
+STAGES = ("fetched", "carded", "voiced", "footage", "rendered", "uploaded")
+STAGE_INDEX = {stage: i for i, stage in enumerate(STAGES)}
+
+
+class Job:
+    __slots__ = ('post_id', 'stage', 'post', 'artifacts', 'error', 'attempts', 'updated_at')
+
+    def __init__(self, post_id: str, stage: str, post: Post, artifacts: Dict[str, str],
+                 error: Optional[str], attempts: int, updated_at: float):
+        self.post_id = post_id
+        self.stage = stage
+        self.post = post
+        self.artifacts = artifacts
+        self.error = error
+        self.attempts = attempts
+        self.updated_at = updated_at
+
+    @property
+    def folder(self) -> str:
+        return f"output-{self.post_id}"
+
+    def reached(self, stage: str) -> bool:
+        return STAGE_INDEX[self.stage] >= STAGE_INDEX[stage]
+
+    def __repr__(self) -> str:
+        return f"Job({self.post_id!r}, stage={self.stage!r}, attempts={self.attempts})"
+
+
+class JobStore:
+    def __init__(self, db_path: Optional[str] = None, max_attempts: int = 5):
+        """
+        Args:
+            db_path: Path of the SQLite database (default: JOB_STORE_PATH or .tokbot/jobs.db)
+            max_attempts: Failures after which a job is no longer returned by `pending`
+        """
+        self.db_path = db_path or os.getenv("JOB_STORE_PATH", ".tokbot/jobs.db")
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " post_id TEXT PRIMARY KEY, stage INTEGER NOT NULL, post TEXT NOT NULL,"
+            " artifacts TEXT NOT NULL DEFAULT '{}', error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS timings ("
+            " post_id TEXT NOT NULL, stage INTEGER NOT NULL, seconds REAL NOT NULL, finished_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS jobs_stage ON jobs (stage, created_at)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+    def add(self, post: Post) -> Job:
+        """Record a fetched post. A post that already has a job keeps its progress."""
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO jobs (post_id, stage, post, created_at, updated_at) VALUES (?, 0, ?, ?, ?)",
+                (post.id, json.dumps(post.to_dict()), now, now),
+            )
+            self.conn.commit()
+        return self.get(post.id)
+
+    def backfill(self, root: str = ".") -> List[Job]:
+        """
+        Register `output-<post id>` folders written before the job store existed, at the
+        stage their files show, so an upgraded install renders them instead of skipping
+        them. Folders that already have a job are left alone. A folder without narration
+        cannot be resumed, because the post body was never saved, and is only reported.
+
+        This is a one-time migration: once it has run, later calls return right away.
+
+        Returns:
+            The jobs that were added
+        """
+        with self._lock:
+            if self.conn.execute("SELECT 1 FROM meta WHERE key = 'folders_backfilled'").fetchone():
+                return []
+
+        added = []
+        for name in sorted(os.listdir(root)):
+            folder = os.path.join(root, name)
+            if not name.startswith("output-") or not os.path.isdir(folder):
+                continue
+            post_id = name[len("output-"):]
+            if self.get(post_id) is not None:
+                continue
+            if not all(os.path.exists(os.path.join(folder, file)) for file in ("reddit.png", "audio.wav")):
+                print(f"Not resuming {folder}: it has no title card or narration")
+                continue
+
+            title = ""
+            if os.path.exists(os.path.join(folder, "title.txt")):
+                with open(os.path.join(folder, "title.txt"), "r", encoding="utf-8") as f:
+                    title = f.read().strip()
+            artifacts = {"card": f"{name}/reddit.png", "title": f"{name}/title.txt", "audio": f"{name}/audio.wav"}
+            stage = "voiced"
+            if os.path.exists(os.path.join(folder, "footage.mp4")):
+                artifacts["footage"] = f"{name}/footage.mp4"
+                stage = "footage"
+
+            self.add(Post(post_id, title=title))
+            self.advance(post_id, stage, artifacts)
+            added.append(self.get(post_id))
+
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('folders_backfilled', ?)", (str(time.time()),))
+            self.conn.commit()
+
+        if added:
+            print(f"Registered {len(added)} output folders from before the job store")
+        return added
+
+    def get(self, post_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT post_id, stage, post, artifacts, error, attempts, updated_at FROM jobs WHERE post_id = ?",
+                (post_id,),
+            ).fetchone()
+        return self._job(row) if row else None
+
+    def advance(self, post_id: str, stage: str, artifacts: Optional[Dict[str, str]] = None,
+                seconds: Optional[float] = None):
+        """
+        Mark `stage` as completed, merge its artifacts into the job and clear the last error.
+
+        Args:
+            post_id: Post of the job
+            stage: Stage that was just completed
+            artifacts: Artifact name -> path produced by the stage
+            seconds: Time the stage took, kept for reporting
+        """
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT artifacts FROM jobs WHERE post_id = ?", (post_id,)).fetchone()
+            if row is None:
+                raise KeyError(f"No job for post {post_id}")
+            merged = json.loads(row[0])
+            merged.update(artifacts or {})
+            self.conn.execute(
+                "UPDATE jobs SET stage = ?, artifacts = ?, error = NULL, attempts = 0, updated_at = ? WHERE post_id = ?",
+                (STAGE_INDEX[stage], json.dumps(merged), now, post_id),
+            )
+            if seconds is not None:
+                self.conn.execute(
+                    "INSERT INTO timings (post_id, stage, seconds, finished_at) VALUES (?, ?, ?, ?)",
+                    (post_id, STAGE_INDEX[stage], seconds, now),
+                )
+            self.conn.commit()
+
+    def fail(self, post_id: str, stage: str, error: Exception):
+        """Record that `stage` failed for a job. The job stays at its last completed stage."""
+        with self._lock:
+            self.conn.execute(
+                "UPDATE jobs SET error = ?, attempts = attempts + 1, updated_at = ? WHERE post_id = ?",
+                (f"{stage}: {error}", time.time(), post_id),
+            )
+            self.conn.commit()
+
+    def pending(self, before: str = "rendered", include_exhausted: bool = False) -> List[Job]:
+        """
+        Jobs that have not reached stage `before`, oldest first.
+
+        Args:
+            before: Stage the jobs have not completed yet
+            include_exhausted: Also return jobs that failed `max_attempts` times in a row
+        """
+        query = "SELECT post_id, stage, post, artifacts, error, attempts, updated_at FROM jobs WHERE stage < ?"
+        params: list = [STAGE_INDEX[before]]
+        if not include_exhausted:
+            query += " AND attempts < ?"
+            params.append(self.max_attempts)
+        with self._lock:
+            rows = self.conn.execute(query + " ORDER BY created_at", params).fetchall()
+        return [self._job(row) for row in rows]
+
+    def at_stage(self, stage: str) -> List[Job]:
+        """Jobs whose last completed stage is exactly `stage`, oldest first."""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT post_id, stage, post, artifacts, error, attempts, updated_at FROM jobs WHERE stage = ? ORDER BY created_at",
+                (STAGE_INDEX[stage],),
+            ).fetchall()
+        return [self._job(row) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self.conn.execute("SELECT stage, COUNT(*) FROM jobs GROUP BY stage").fetchall()
+        counts = {stage: 0 for stage in STAGES}
+        counts.update({STAGES[stage]: count for stage, count in rows})
+        return counts
+
+    def timings(self) -> Dict[str, List[float]]:
+        """Seconds taken by every completed stage, per stage."""
+        with self._lock:
+            rows = self.conn.execute("SELECT stage, seconds FROM timings").fetchall()
+        timings = {stage: [] for stage in STAGES}
+        for stage, seconds in rows:
+            timings[STAGES[stage]].append(seconds)
+        return timings
+
+    def failed(self) -> Iterator[Job]:
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT post_id, stage, post, artifacts, error, attempts, updated_at FROM jobs WHERE error IS NOT NULL ORDER BY updated_at"
+            ).fetchall()
+        return (self._job(row) for row in rows)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    @staticmethod
+    def _job(row) -> Job:
+        post_id, stage, post, artifacts, error, attempts, updated_at = row
+        return Job(post_id, STAGES[stage], Post.from_dict(json.loads(post)), json.loads(artifacts), error, attempts, updated_at)
+
+
+if __name__ == "__main__":
+    import dotenv
+    dotenv.load_dotenv()
+    store = JobStore()
+    for stage, count in store.counts().items():
+        print(f"{stage:>9}: {count}")
+    for job in store.failed():
+        print(f"{job.post_id} after {job.stage} ({job.attempts} attempts): {job.error}")
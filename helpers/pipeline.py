@@ -0,0 +1,183 @@
+"""
+Staged concurrent pipeline.
+
+Items flow through a chain of stages connected by bounded queues. Every stage has its own
+pool of workers, so a network-bound stage (Reddit, Cartesia, yt-dlp) keeps working while an
+encode stage is busy, and throughput is set by the slowest stage instead of the sum of all
+of them. A full queue blocks the stage feeding it, which bounds the work in flight.
+
+A stage function takes one item and returns the item for the next stage. Returning None
+drops the item, and an exception drops the item and is recorded as a failure; neither stops
+the other items.
+"""
+
+import concurrent.futures
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+_DONE = object()
+
+
+class Stage:
+    def __init__(self, name: str, fn: Callable[[Any], Any], workers: int = 1, kind: str = "thread",
+                 queue_size: Optional[int] = None):
+        """
+        Args:
+            name: Name used in failures and stats
+            fn: Function applied to every item; must be picklable for process stages
+            workers: Number of items processed concurrently
+            kind: "thread" for I/O-bound work, "process" for CPU-bound work
+            queue_size: Capacity of the queue feeding this stage (default: 2 * workers)
+        """
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown stage kind: {kind}")
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.kind = kind
+        self.queue_size = queue_size or 2 * self.workers
+
+
+class StageStats:
+    __slots__ = ('name', 'processed', 'failed', 'dropped', 'durations')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.durations: List[float] = []
+
+    def percentile(self, p: float) -> float:
+        if not self.durations:
+            return 0.0
+        ordered = sorted(self.durations)
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    def __str__(self) -> str:
+        busy = sum(self.durations)
+        return (f"{self.name}: {self.processed} ok, {self.failed} failed, {self.dropped} dropped, "
+                f"p50 {self.percentile(50):.2f}s, p95 {self.percentile(95):.2f}s, busy {busy:.1f}s")
+
+
+class PipelineResult:
+    def __init__(self, results: List[Any], failures: List[Tuple[str, Any, Exception]], stats: List[StageStats], elapsed: float):
+        self.results = results
+        self.failures = failures
+        self.stats = stats
+        self.elapsed = elapsed
+
+    def summary(self) -> str:
+        lines = [f"{len(self.results)} items finished, {len(self.failures)} failed in {self.elapsed:.1f}s"]
+        lines.extend(f"  {stats}" for stats in self.stats)
+        return "\n".join(lines)
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage]):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+
+    def run(self, items: Iterable[Any]) -> PipelineResult:
+        """
+        Push every item through all stages and wait until the pipeline drains.
+
+        `items` is consumed lazily by a feeder thread, so a streaming source (e.g. posts
+        yielded while a subreddit is still being paged) overlaps with the later stages.
+        """
+        started = time.perf_counter()
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        output: "queue.Queue" = queue.Queue()
+        stats = [StageStats(stage.name) for stage in self.stages]
+        failures: List[Tuple[str, Any, Exception]] = []
+        lock = threading.Lock()
+        executors: Dict[int, concurrent.futures.ProcessPoolExecutor] = {
+            i: concurrent.futures.ProcessPoolExecutor(max_workers=stage.workers)
+            for i, stage in enumerate(self.stages) if stage.kind == "process"
+        }
+        remaining = [stage.workers for stage in self.stages]
+
+        def feed():
+            try:
+                for item in items:
+                    queues[0].put(item)
+            except Exception as e:
+                with lock:
+                    failures.append(("source", None, e))
+                print(f"Pipeline source failed: {e}")
+            finally:
+                for _ in range(self.stages[0].workers):
+                    queues[0].put(_DONE)
+
+        def work(index: int):
+            stage = self.stages[index]
+            stage_stats = stats[index]
+            downstream = queues[index + 1] if index + 1 < len(self.stages) else output
+
+            while True:
+                item = queues[index].get()
+                if item is _DONE:
+                    break
+
+                start = time.perf_counter()
+                try:
+                    if stage.kind == "process":
+                        result = executors[index].submit(stage.fn, item).result()
+                    else:
+                        result = stage.fn(item)
+                except Exception as e:
+                    with lock:
+                        stage_stats.durations.append(time.perf_counter() - start)
+                        stage_stats.failed += 1
+                        failures.append((stage.name, item, e))
+                    print(f"Pipeline stage {stage.name} failed for {item}: {e}")
+                    continue
+
+                with lock:
+                    stage_stats.durations.append(time.perf_counter() - start)
+                    if result is None:
+                        stage_stats.dropped += 1
+                    else:
+                        stage_stats.processed += 1
+                if result is not None:
+                    downstream.put(result)
+
+            # The last worker of a stage to finish closes the next stage.
+            with lock:
+                remaining[index] -= 1
+                last = remaining[index] == 0
+            if last:
+                if index + 1 < len(self.stages):
+                    for _ in range(self.stages[index + 1].workers):
+                        queues[index + 1].put(_DONE)
+                else:
+                    output.put(_DONE)
+
+        threads = [threading.Thread(target=feed, name="pipeline-source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            threads.extend(
+                threading.Thread(target=work, args=(index,), name=f"pipeline-{stage.name}-{n}", daemon=True)
+                for n in range(stage.workers)
+            )
+
+        try:
+            for thread in threads:
+                thread.start()
+
+            results = []
+            while True:
+                result = output.get()
+                if result is _DONE:
+                    break
+                results.append(result)
+
+            for thread in threads:
+                thread.join()
+        finally:
+            for executor in executors.values():
+                executor.shutdown()
+
+        return PipelineResult(results, failures, stats, time.perf_counter() - started)
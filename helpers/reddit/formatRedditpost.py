@@ -1,6 +1,33 @@
 from PIL import Image, ImageDraw, ImageFont
 import os
-from typing import Tuple, Optional
+from functools import lru_cache
+from typing import Iterable, List, Tuple, Optional
+
+
+@lru_cache(maxsize=32)
+def load_font(font_path: Optional[str], size: int):
+    """
+    Load a TrueType font once per (path, size), falling back to Pillow's default font.
+    
+    Args:
+        font_path: Path to the .ttf file
+        size: Font size in points
+    """
+    if not font_path:
+        print("No font path configured, using the default font")
+        return ImageFont.load_default()
+    try:
+        return ImageFont.truetype(font_path, size)
+    except OSError as e:
+        print(f"Failed to load font {font_path}, using the default font: {e}")
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=8192)
+def text_width(font, text: str) -> float:
+    """Advance width of `text` in `font`, cached per (font, text)."""
+    return font.getlength(text)
+
 
 class ImageGenerator:
     def __init__(self, template_path: str = "public/redditTemplate.png"):
@@ -17,7 +44,11 @@ class ImageGenerator:
     def load_template(self):
         """Load the template image."""
         try:
-            self.template = Image.open(self.template_path)
+            # Decode now: Image.open is lazy, and concurrent copies of a lazily loaded
+            # image read the same file handle at once.
+            with Image.open(self.template_path) as template:
+                template.load()
+                self.template = template.copy()
         except Exception as e:
             raise Exception(f"Failed to load template image: {e}")
     
@@ -49,12 +80,8 @@ class ImageGenerator:
         
         img = self.template.copy()
         draw = ImageDraw.Draw(img)
-        try:
-            subreddit_font = ImageFont.truetype(os.getenv("SUBREDDIT_FONT_PATH"), subreddit_font_size)
-            title_font = ImageFont.truetype(os.getenv("TITLE_FONT_PATH"), title_font_size)
-        except:
-            subreddit_font = ImageFont.load_default()
-            title_font = ImageFont.load_default()
+        subreddit_font = load_font(os.getenv("SUBREDDIT_FONT_PATH"), subreddit_font_size)
+        title_font = load_font(os.getenv("TITLE_FONT_PATH"), title_font_size)
         
         if subreddit_position is None:
             subreddit_x = 324
@@ -78,6 +105,27 @@ class ImageGenerator:
         
         return output_path, post_title
     
+    def add_text_to_images(
+        self,
+        cards: Iterable[Tuple[str, str, str]],
+        **kwargs
+    ) -> List[Tuple[str, str]]:
+        """
+        Render many title cards in one call, sharing the loaded template, fonts and
+        word-width cache.
+        
+        Args:
+            cards: (subreddit, post_title, output_path) tuples
+            **kwargs: Styling options passed to `add_text_to_image`
+        
+        Returns:
+            List of (output_path, post_title) tuples in input order
+        """
+        return [
+            self.add_text_to_image(subreddit, post_title, output_path, **kwargs)
+            for subreddit, post_title, output_path in cards
+        ]
+    
     def _draw_wrapped_text(
         self, 
         draw: ImageDraw.Draw, 
@@ -88,7 +136,8 @@ class ImageGenerator:
         max_width: int
     ):
         """
-        Draw text with word wrapping.
+        Draw text with word wrapping. Line widths are accumulated from cached
+        per-word widths instead of re-measuring the whole line for every word.
         
         Args:
             draw: ImageDraw object
@@ -102,21 +151,25 @@ class ImageGenerator:
         words = text.split()
         lines = []
         current_line = []
+        line_width = 0.0
+        space_width = text_width(font, " ")
         
         for word in words:
-            current_line.append(word)
-            test_line = " ".join(current_line)
-            bbox = draw.textbbox((0, 0), test_line, font=font)
-            text_width = bbox[2] - bbox[0]
+            word_width = text_width(font, word)
+            test_width = line_width + space_width + word_width if current_line else word_width
             
-            if text_width > max_width:
-                current_line.pop()
+            if test_width > max_width:
                 if current_line:
                     lines.append(" ".join(current_line))
                     current_line = [word]
+                    line_width = word_width
                 else:
                     lines.append(word)
                     current_line = []
+                    line_width = 0.0
+            else:
+                current_line.append(word)
+                line_width = test_width
         
         if current_line:
             lines.append(" ".join(current_line))
@@ -0,0 +1,127 @@
+"""
+Composable filters for Reddit candidate posts.
+
+Each filter is a named predicate with a relative cost. A FilterChain evaluates its filters
+cheapest-first in a single pass over the candidates, stops at the first filter that rejects
+a post, and counts how many posts each filter rejected.
+"""
+
+from collections import Counter
+from typing import Callable, Container, Iterable, List, Optional
+
+from helpers.reddit.redditPost import Post
+
+
+class PostFilter:
+    def __init__(self, name: str, predicate: Callable[[Post], bool], cost: int = 1):
+        """
+        Args:
+            name: Name used in rejection statistics
+            predicate: Returns True if the post should be kept
+            cost: Relative evaluation cost; cheaper filters run first
+        """
+        self.name = name
+        self.predicate = predicate
+        self.cost = cost
+
+    def __repr__(self):
+        return f"PostFilter({self.name!r}, cost={self.cost})"
+
+
+class FilterChain:
+    def __init__(self, filters: Optional[Iterable[PostFilter]] = None):
+        self.filters: List[PostFilter] = []
+        self.rejections: Counter = Counter()
+        self.evaluated = 0
+        self._compiled = None
+        for post_filter in filters or []:
+            self.add(post_filter)
+
+    def add(self, post_filter: PostFilter) -> "FilterChain":
+        self.filters.append(post_filter)
+        self._compiled = None
+        return self
+
+    def compile(self) -> Callable[[Post], Optional[str]]:
+        """
+        Build a single predicate that returns None for an accepted post, or the name of the
+        first filter that rejected it. Filters are ordered by cost; ties keep insertion order.
+        """
+        ordered = sorted(self.filters, key=lambda f: f.cost)
+        checks = tuple((f.name, f.predicate) for f in ordered)
+
+        def first_rejection(post: Post) -> Optional[str]:
+            for name, predicate in checks:
+                if not predicate(post):
+                    return name
+            return None
+
+        self._compiled = first_rejection
+        return first_rejection
+
+    def accepts(self, post: Post) -> bool:
+        """Evaluate one post, recording the rejecting filter if any."""
+        first_rejection = self._compiled or self.compile()
+        self.evaluated += 1
+        rejected_by = first_rejection(post)
+        if rejected_by is None:
+            return True
+        self.rejections[rejected_by] += 1
+        return False
+
+    def apply(self, posts: Iterable[Post]) -> List[Post]:
+        """Return the posts accepted by every filter, in their original order."""
+        first_rejection = self._compiled or self.compile()
+        rejections = self.rejections
+        accepted = []
+        for post in posts:
+            self.evaluated += 1
+            rejected_by = first_rejection(post)
+            if rejected_by is None:
+                accepted.append(post)
+            else:
+                rejections[rejected_by] += 1
+        return accepted
+
+    def summary(self) -> str:
+        """One-line description of how many posts each filter rejected."""
+        if not self.rejections:
+            return f"{self.evaluated} evaluated, none rejected"
+        counts = ", ".join(f"{name}={count}" for name, count in self.rejections.most_common())
+        return f"{self.evaluated} evaluated, rejected by {counts}"
+
+
+def score_filter(min_score: int = 0, max_score: Optional[int] = None) -> PostFilter:
+    if max_score is None:
+        return PostFilter("score", lambda post: post.score >= min_score)
+    return PostFilter("score", lambda post: min_score <= post.score <= max_score)
+
+
+def ratio_filter(min_ratio: float = 0.0) -> PostFilter:
+    return PostFilter("ratio", lambda post: post.upvote_ratio >= min_ratio)
+
+
+def comments_filter(min_comments: int = 0) -> PostFilter:
+    return PostFilter("comments", lambda post: post.num_comments >= min_comments)
+
+
+def nsfw_filter(is_nsfw: bool = False) -> PostFilter:
+    return PostFilter("nsfw", lambda post: post.over_18 == is_nsfw)
+
+
+def body_length_filter(min_body_length: int = 100, max_body_length: int = 1000) -> PostFilter:
+    def within_bounds(post: Post) -> bool:
+        body_text = post.selftext or ''
+        length = len(body_text)
+        # Stripping only shortens the body, so a raw length below the minimum is final.
+        if length < min_body_length:
+            return False
+        if body_text[:1].isspace() or body_text[-1:].isspace():
+            length = len(body_text.strip())
+        return min_body_length <= length <= max_body_length
+
+    return PostFilter("body_length", within_bounds, cost=2)
+
+
+def unused_filter(used_ids: Container[str]) -> PostFilter:
+    return PostFilter("used", lambda post: post.id not in used_ids, cost=3)
@@ -0,0 +1,108 @@
+"""
+Token-bucket request scheduler driven by Reddit's rate limit headers.
+
+Reddit reports the remaining quota on every OAuth response:
+    - X-Ratelimit-Used: requests made in the current window
+    - X-Ratelimit-Remaining: requests left in the current window
+    - X-Ratelimit-Reset: seconds until the window resets
+"""
+
+import threading
+import time
+from typing import Mapping, Optional
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket that spreads the remaining quota evenly over the rest of the
+    current window, allowing short bursts of up to `burst` requests.
+    """
+
+    def __init__(self, quota: int = 1000, period: float = 600.0, burst: int = 10):
+        """
+        Initialize the scheduler with the quota to assume until the first response arrives.
+
+        Args:
+            quota: Requests allowed per window
+            period: Length of a rate limit window in seconds
+            burst: Maximum number of requests that may be sent back to back
+        """
+        self.quota = quota
+        self.period = period
+        self.burst = burst
+        self.rate = quota / period
+        self.tokens = float(burst)
+        self.remaining: Optional[float] = None
+        self.reset_at: Optional[float] = None
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a request may be sent, then consume one token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+
+                if self.remaining is not None and self.remaining < 1:
+                    wait = self.reset_at - now
+                elif self.tokens >= 1:
+                    self.tokens -= 1
+                    if self.remaining is not None:
+                        self.remaining -= 1
+                    return
+                else:
+                    wait = (1 - self.tokens) / self.rate
+
+            time.sleep(max(wait, 0.01))
+
+    def update(self, headers: Mapping[str, str]):
+        """
+        Resynchronize the bucket with the quota reported by the server.
+
+        Args:
+            headers: Response headers of a Reddit API call
+        """
+        try:
+            remaining = float(headers['X-Ratelimit-Remaining'])
+            reset = float(headers['X-Ratelimit-Reset'])
+        except (KeyError, TypeError, ValueError):
+            return
+
+        used = headers.get('X-Ratelimit-Used')
+
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if used is not None:
+                try:
+                    self.quota = int(float(used) + remaining)
+                except ValueError:
+                    pass
+            self.remaining = remaining
+            self.reset_at = now + reset
+            self.rate = max(remaining, 1) / max(reset, 1.0)
+
+    def backoff(self, delay: float):
+        """
+        Pause all requests for `delay` seconds, e.g. after a 429 response.
+
+        Args:
+            delay: Seconds to wait before the next request
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = 0.0
+            self.remaining = 0
+            self.reset_at = max(self.reset_at or now, now + delay)
+            self.last_refill = now
+
+    def _refill(self, now: float):
+        """Add the tokens earned since the last refill and start a new window if one has elapsed."""
+        if self.reset_at is not None and now >= self.reset_at:
+            self.remaining = None
+            self.reset_at = None
+            self.rate = self.quota / self.period
+
+        self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
@@ -1,8 +1,19 @@
 import os
+import threading
+import heapq
+import itertools
+import concurrent.futures
 import requests
-from typing import List, Dict, Optional
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from typing import List, Dict, Iterator, Optional, Tuple
 from helpers.uploaders.sheetsLogger import SheetsLogger
+from helpers.uploaders.usedPostIndex import UsedPostIndex
+from helpers.reddit.rateLimiter import RateLimiter
+from helpers.reddit.redditPost import Post
+from helpers.reddit.postFilters import (
+    FilterChain, score_filter, ratio_filter, comments_filter,
+    body_length_filter, nsfw_filter, unused_filter
+)
 
 class RedditPostExtractor:
     """
@@ -11,30 +22,62 @@ class RedditPostExtractor:
     with customizable filtering options.
     """
     
-    def __init__(self):
-        """Initialize the Reddit API client with credentials from environment variables."""
+    def __init__(self, pool_size: int = 16, max_retries: int = 3, sheets_logger: Optional[SheetsLogger] = None,
+                 used_index: Optional[UsedPostIndex] = None):
+        """
+        Initialize the Reddit API client with credentials from environment variables.
+        
+        Args:
+            pool_size: Maximum number of pooled keep-alive connections shared by all threads
+            max_retries: Number of times a rate limited (429) request is retried after backing off
+            sheets_logger: Logger whose sheet the used-post index mirrors, e.g. the caller's
+                           BufferedSheetsLogger (default: a new SheetsLogger)
+            used_index: Used-post index to share with the caller (default: one built on `sheets_logger`)
+        """
         self.client_id = os.getenv('REDDIT_CLIENT_ID')
         self.client_secret = os.getenv('REDDIT_CLIENT_SECRET')
         self.user_agent = 'RedditPostExtractor/1.0'
-        self.sheetsLogger = SheetsLogger() 
+        self.used_index = used_index or UsedPostIndex(sheets_logger or SheetsLogger())
         if not self.client_id or not self.client_secret:
             raise ValueError("REDDIT_CLIENT_ID and REDDIT_CLIENT_SECRET must be set in .env file")
         
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.headers.update({'User-Agent': self.user_agent})
+        
+        self.rate_limiter = RateLimiter()
+        self.max_retries = max_retries
+        
         self.access_token = None
+        self._auth_lock = threading.Lock()
+        self.filter_stats: Dict[str, FilterChain] = {}
         self._authenticate()
     
-    def _authenticate(self):
-        """Authenticate with Reddit API using client credentials flow."""
+    def _authenticate(self, stale_token: Optional[str] = None):
+        """
+        Authenticate with Reddit API using client credentials flow.
+        
+        Args:
+            stale_token: Token that was rejected by the API. If another thread has already
+                         replaced it, the refresh is skipped so all threads share one token.
+        """
+        with self._auth_lock:
+            if stale_token is not None and self.access_token != stale_token:
+                return
+            self._request_token()
+    
+    def _request_token(self):
+        """Request a new OAuth token from Reddit."""
         auth_url = 'https://www.reddit.com/api/v1/access_token'
         auth_data = {
             'grant_type': 'client_credentials'
         }
         
-        response = requests.post(
+        response = self.session.post(
             auth_url,
             data=auth_data,
-            auth=(self.client_id, self.client_secret),
-            headers={'User-Agent': self.user_agent}
+            auth=(self.client_id, self.client_secret)
         )
         
         if response.status_code == 200:
@@ -42,7 +85,7 @@ class RedditPostExtractor:
         else:
             raise Exception(f"Authentication failed: {response.status_code}")
     
-    def get_posts(self, subreddit: str, limit: int = 25, time_filter: str = 'day') -> List[Dict]:
+    def get_posts(self, subreddit: str, limit: int = 25, time_filter: str = 'day') -> List[Post]:
         """
         Fetch posts from a specified subreddit with basic filtering.
         
@@ -52,146 +95,203 @@ class RedditPostExtractor:
             time_filter: Time period for posts ('hour', 'day', 'week', 'month', 'year', 'all')
         
         Returns:
-            List of post dictionaries containing post data
+            List of posts containing post data
+        """
+        posts, _ = self.get_posts_page(subreddit, limit, time_filter)
+        return posts
+    
+    def get_posts_page(self, subreddit: str, limit: int = 25, time_filter: str = 'day',
+                       after: Optional[str] = None) -> Tuple[List[Post], Optional[str]]:
+        """
+        Fetch a single page of a subreddit's top listing.
+        
+        Args:
+            subreddit: Name of the subreddit to fetch posts from
+            limit: Maximum number of posts to fetch (Reddit caps this at 100)
+            time_filter: Time period for posts ('hour', 'day', 'week', 'month', 'year', 'all')
+            after: Fullname of the last post of the previous page, or None for the first page
+        
+        Returns:
+            Tuple of (posts, fullname to pass as `after` for the next page).
+            The cursor is None once the listing has been exhausted.
         """
         if not self.access_token:
             self._authenticate()
         
         url = f'https://oauth.reddit.com/r/{subreddit}/top.json'
-        headers = {
-            'Authorization': f'Bearer {self.access_token}',
-            'User-Agent': self.user_agent
-        }
         params = {
-            'limit': limit,
+            'limit': min(limit, 100),
             't': time_filter
         }
+        if after:
+            params['after'] = after
         
-        response = requests.get(url, headers=headers, params=params)
+        response = self._get(url, params)
         
         if response.status_code == 200:
-            posts = response.json()['data']['children']
-            return [self._parse_post(post['data']) for post in posts]
+            listing = response.json()['data']
+            posts = [self._parse_post(post['data']) for post in listing['children']]
+            return posts, listing.get('after')
         else:
             raise Exception(f"Failed to fetch posts: {response.status_code}")
     
-    def filter_posts_by_score(self, posts: List[Dict], min_score: int = 0, max_score: Optional[int] = None) -> List[Dict]:
+    def _get(self, url: str, params: Dict) -> requests.Response:
+        """
+        Send a GET request to the Reddit API, paced by the rate limiter.
+        
+        A 401 refreshes the shared token and retries once. A 429 pauses every thread until
+        the window resets (or for `Retry-After` seconds) and retries up to `max_retries` times.
+        
+        Args:
+            url: API endpoint to request
+            params: Query parameters
+        
+        Returns:
+            The final response
+        """
+        refreshed = False
+        attempt = 0
+        
+        while True:
+            self.rate_limiter.acquire()
+            token = self.access_token
+            response = self.session.get(url, headers={'Authorization': f'Bearer {token}'}, params=params)
+            self.rate_limiter.update(response.headers)
+            
+            if response.status_code == 401 and not refreshed:
+                refreshed = True
+                self._authenticate(stale_token=token)
+                continue
+            
+            if response.status_code == 429 and attempt < self.max_retries:
+                delay = self._retry_delay(response, attempt)
+                attempt += 1
+                print(f"Rate limited by Reddit, backing off for {delay:.0f}s (attempt {attempt}/{self.max_retries})")
+                self.rate_limiter.backoff(delay)
+                continue
+            
+            return response
+    
+    @staticmethod
+    def _retry_delay(response: requests.Response, attempt: int) -> float:
+        """Seconds to wait after a 429, preferring the server's hints over exponential backoff."""
+        for header in ('Retry-After', 'X-Ratelimit-Reset'):
+            value = response.headers.get(header)
+            if value:
+                try:
+                    return max(float(value), 1.0)
+                except ValueError:
+                    pass
+        return float(min(2 ** (attempt + 1), 60))
+    
+    def filter_posts_by_score(self, posts: List[Post], min_score: int = 0, max_score: Optional[int] = None) -> List[Post]:
         """
         Filter posts based on their score (upvotes - downvotes).
         
         Args:
-            posts: List of post dictionaries to filter
+            posts: List of posts to filter
             min_score: Minimum score threshold (default: 0)
             max_score: Maximum score threshold (optional)
         
         Returns:
             Filtered list of posts meeting the score criteria
         """
-        filtered_posts = []
-        
-        for post in posts:
-            score = post.get('score', 0)
-            if score >= min_score and (max_score is None or score <= max_score):
-                filtered_posts.append(post)
-        
-        return filtered_posts
+        return FilterChain([score_filter(min_score, max_score)]).apply(posts)
     
-    def filter_posts_by_ratio(self, posts: List[Dict], min_ratio: float = 0.0) -> List[Dict]:
+    def filter_posts_by_ratio(self, posts: List[Post], min_ratio: float = 0.0) -> List[Post]:
         """
         Filter posts based on upvote ratio (percentage of upvotes).
         
         Args:
-            posts: List of post dictionaries to filter
+            posts: List of posts to filter
             min_ratio: Minimum upvote ratio threshold (0.0 to 1.0)
         
         Returns:
             Filtered list of posts meeting the ratio criteria
         """
-        filtered_posts = []
-        
-        for post in posts:
-            upvote_ratio = post.get('upvote_ratio', 0.0)
-            if upvote_ratio >= min_ratio:
-                filtered_posts.append(post)
-        
-        return filtered_posts
+        return FilterChain([ratio_filter(min_ratio)]).apply(posts)
     
-    def filter_posts_by_comments(self, posts: List[Dict], min_comments: int = 0) -> List[Dict]:
+    def filter_posts_by_comments(self, posts: List[Post], min_comments: int = 0) -> List[Post]:
         """
         Filter posts based on number of comments.
         
         Args:
-            posts: List of post dictionaries to filter
+            posts: List of posts to filter
             min_comments: Minimum number of comments required
         
         Returns:
             Filtered list of posts meeting the comment criteria
         """
-        filtered_posts = []
-        
-        for post in posts:
-            num_comments = post.get('num_comments', 0)
-            if num_comments >= min_comments:
-                filtered_posts.append(post)
-        
-        return filtered_posts
+        return FilterChain([comments_filter(min_comments)]).apply(posts)
     
-    def filter_posts_by_body_length(self, posts: List[Dict], min_body_length: int = 100, max_body_length: int = 1000) -> List[Dict]:
+    def filter_posts_by_body_length(self, posts: List[Post], min_body_length: int = 100, max_body_length: int = 1000) -> List[Post]:
         """
         Filter posts based on the length of the post body (selftext).
         
         Args:
-            posts: List of post dictionaries to filter
+            posts: List of posts to filter
             min_body_length: Minimum number of characters in the post body
             max_body_length: Maximum number of characters in the post body
         Returns:
             Filtered list of posts meeting the body length criteria
         """
-        filtered_posts = []
-        
-        for post in posts:
-            # Get the body text (selftext for text posts, or empty string for link posts)
-            body_text = post.get('selftext', '')
-            body_length = len(body_text.strip())
-            
-            if body_length >= min_body_length and body_length <= max_body_length:
-                filtered_posts.append(post)
-        
-        return filtered_posts
+        return FilterChain([body_length_filter(min_body_length, max_body_length)]).apply(posts)
     
-    def filter_posts_by_nsfw(self, posts: List[Dict], is_nsfw: bool = False) -> List[Dict]:
+    def filter_posts_by_nsfw(self, posts: List[Post], is_nsfw: bool = False) -> List[Post]:
         """
         Filter posts based on whether they are NSFW.
         
         Args:
-            posts: List of post dictionaries to filter
+            posts: List of posts to filter
             is_nsfw: Whether to filter for NSFW posts   
         
         Returns:
             Filtered list of posts meeting the NSFW criteria
         """
-        filtered_posts = []
-        
-        for post in posts:
-            if post.get('over_18', False) == is_nsfw:
-                filtered_posts.append(post)
-        
-        return filtered_posts
+        return FilterChain([nsfw_filter(is_nsfw)]).apply(posts)
     
-    def filter_used_posts(self, posts: List[Dict]) -> List[Dict]:
+    def filter_used_posts(self, posts: List[Post]) -> List[Post]:
         """
         Filter posts that have already been used.
+        
+        Membership is answered by the local used-post index, which is refreshed from the
+        sheet at most once every `used_index.sync_interval` seconds.
         """
-        used_post_ids = self.sheetsLogger.get_ids_set()
-        return [post for post in posts if post.get('id') not in used_post_ids]  
+        self.used_index.maybe_sync()
+        return FilterChain([unused_filter(self.used_index)]).apply(posts)
 
     
+    def build_filter_chain(self, min_score: int = 100, min_ratio: float = 0.8, min_comments: int = 10,
+                           min_body_length: int = 100, max_body_length: int = 1000) -> FilterChain:
+        """
+        Build the fused filter used to qualify candidate posts.
+        
+        Args:
+            min_score: Minimum score threshold
+            min_ratio: Minimum upvote ratio threshold
+            min_comments: Minimum number of comments required
+            min_body_length: Minimum number of characters in the post body
+            max_body_length: Maximum number of characters in the post body
+        Returns:
+            FilterChain evaluating every criterion, including the used-post check, in one pass
+        """
+        return FilterChain([
+            score_filter(min_score),
+            ratio_filter(min_ratio),
+            comments_filter(min_comments),
+            body_length_filter(min_body_length, max_body_length),
+            nsfw_filter(False),
+            unused_filter(self.used_index),
+        ])
+    
     def get_top_posts_by_rating(self, subreddit: str, limit: int = 25, 
                                min_score: int = 100, min_ratio: float = 0.8,
-                               min_comments: int = 10, min_body_length: int = 100, max_body_length: int = 1000) -> List[Dict]:
+                               min_comments: int = 10, min_body_length: int = 100, max_body_length: int = 1000,
+                               time_filter: str = 'day', after: Optional[str] = None) -> List[Post]:
         """
         Get top posts from a subreddit with comprehensive rating filters.
-        Fetches posts until we have enough that meet all criteria.
+        Pages through the listing until we have enough posts that meet all criteria
+        or the listing runs out.
         
         Args:
             subreddit: Name of the subreddit to fetch posts from
@@ -201,51 +301,156 @@ class RedditPostExtractor:
             min_comments: Minimum number of comments required
             min_body_length: Minimum number of characters in the post body
             max_body_length: Maximum number of characters in the post body  
+            time_filter: Time period for posts ('hour', 'day', 'week', 'month', 'year', 'all')
+            after: Fullname to resume the listing from, or None to start at the first page
         Returns:
             List of high-quality posts meeting all criteria
         """
+        all_posts = list(self._iter_qualified_posts(
+            subreddit, limit, min_score, min_ratio, min_comments,
+            min_body_length, max_body_length, time_filter, after
+        ))
+        all_posts.sort(key=lambda x: x.score, reverse=True)
+        return all_posts[:limit]
+    
+    def iter_top_posts_by_rating(self, subreddit: str, limit: int = 25,
+                                 min_score: int = 100, min_ratio: float = 0.8,
+                                 min_comments: int = 10, min_body_length: int = 100, max_body_length: int = 1000,
+                                 time_filter: str = 'day', after: Optional[str] = None,
+                                 lookahead: int = 0) -> Iterator[Post]:
+        """
+        Stream top posts from a subreddit as soon as they pass every filter, so callers can
+        start processing the first post while later pages are still being fetched.
+        
+        Args:
+            subreddit: Name of the subreddit to fetch posts from
+            limit: Maximum number of posts to yield
+            min_score: Minimum score threshold
+            min_ratio: Minimum upvote ratio threshold
+            min_comments: Minimum number of comments required
+            min_body_length: Minimum number of characters in the post body
+            max_body_length: Maximum number of characters in the post body
+            time_filter: Time period for posts ('hour', 'day', 'week', 'month', 'year', 'all')
+            after: Fullname to resume the listing from, or None to start at the first page
+            lookahead: Number of qualified posts held back and ranked by score before the best
+                       one is yielded. 0 yields every post immediately in listing order.
+        Yields:
+            Posts meeting all criteria
+        """
+        window = []
+        sequence = itertools.count()
+        yielded = 0
+        
+        qualified = self._iter_qualified_posts(
+            subreddit, limit, min_score, min_ratio, min_comments,
+            min_body_length, max_body_length, time_filter, after
+        )
+        try:
+            for post in qualified:
+                heapq.heappush(window, (-post.score, next(sequence), post))
+                if len(window) > lookahead:
+                    yield heapq.heappop(window)[2]
+                    yielded += 1
+                    if yielded >= limit:
+                        return
+            
+            while window and yielded < limit:
+                yield heapq.heappop(window)[2]
+                yielded += 1
+        finally:
+            qualified.close()
+    
+    def _iter_qualified_posts(self, subreddit: str, limit: int, min_score: int, min_ratio: float,
+                              min_comments: int, min_body_length: int, max_body_length: int,
+                              time_filter: str, after: Optional[str]) -> Iterator[Post]:
+        """
+        Page through a subreddit listing and yield every new post that meets all criteria.
+        Stops after the page on which `limit` qualified posts have been reached, when the
+        listing runs out, or after `max_fetch_attempts` pages.
+        """
         seen_ids = set()
-        all_posts = []
+        chain = self.build_filter_chain(min_score, min_ratio, min_comments, min_body_length, max_body_length)
+        self.filter_stats[subreddit] = chain
         fetch_limit = min(limit * 3, 100)
         max_fetch_attempts = 5
         current_fetch = 0
         total_fetched = 0
         
-        while len(all_posts) < limit and current_fetch < max_fetch_attempts:
-            current_fetch += 1
-            
-            new_posts = self.get_posts(subreddit, fetch_limit)
-            
-            if not new_posts:
-                break
-            
-            total_fetched += len(new_posts)
-            
-            filtered_posts = self.filter_posts_by_score(new_posts, min_score)
-            filtered_posts = self.filter_posts_by_ratio(filtered_posts, min_ratio)
-            filtered_posts = self.filter_posts_by_comments(filtered_posts, min_comments)
-            filtered_posts = self.filter_posts_by_body_length(filtered_posts, min_body_length, max_body_length)
-            filtered_posts = self.filter_posts_by_nsfw(filtered_posts, False)
-            filtered_posts = self.filter_used_posts(filtered_posts)
-            
-            for post in filtered_posts:
-                if post['id'] not in seen_ids:
-                    seen_ids.add(post['id'])
-                    all_posts.append(post)
-            
-            if len(all_posts) >= limit:
-                break
-            
-            fetch_limit = min(int(fetch_limit * 1.5), 100)
+        try:
+            while len(seen_ids) < limit and current_fetch < max_fetch_attempts:
+                current_fetch += 1
+                
+                new_posts, after = self.get_posts_page(subreddit, fetch_limit, time_filter, after)
+                
+                total_fetched += len(new_posts)
+                
+                self.used_index.maybe_sync()
+                
+                for post in new_posts:
+                    if post.id not in seen_ids and chain.accepts(post):
+                        seen_ids.add(post.id)
+                        yield post
+                
+                if not new_posts or after is None:
+                    break
+                
+                fetch_limit = min(int(fetch_limit * 1.5), 100)
+        finally:
+            print(f"Fetched {total_fetched} total posts over {current_fetch} pages from r/{subreddit}, {len(seen_ids)} met criteria ({chain.summary()})")
+    
+    def get_top_posts_multi(self, subreddits: List[str], limit: int = 25,
+                            min_score: int = 100, min_ratio: float = 0.8,
+                            min_comments: int = 10, min_body_length: int = 100, max_body_length: int = 1000,
+                            time_filter: str = 'day', max_workers: int = 8) -> List[Post]:
+        """
+        Fetch filtered top posts from several subreddits concurrently and merge them
+        into one candidate pool ranked by score.
         
-        all_posts.sort(key=lambda x: x.get('score', 0), reverse=True)
-        result = all_posts[:limit]
+        All workers share this extractor's pooled session and OAuth token. A subreddit
+        that fails to fetch is reported and skipped rather than failing the whole pool.
         
-        print(f"Fetched {total_fetched} total posts, filtered to {len(result)} posts meeting criteria")
+        Args:
+            subreddits: Names of the subreddits to fetch posts from
+            limit: Maximum number of posts to return across all subreddits
+            min_score: Minimum score threshold
+            min_ratio: Minimum upvote ratio threshold
+            min_comments: Minimum number of comments required
+            min_body_length: Minimum number of characters in the post body
+            max_body_length: Maximum number of characters in the post body
+            time_filter: Time period for posts ('hour', 'day', 'week', 'month', 'year', 'all')
+            max_workers: Maximum number of subreddits fetched at the same time
+        Returns:
+            List of the highest scoring posts meeting all criteria
+        """
+        if not subreddits:
+            return []
+        
+        pool = {}
+        workers = max(1, min(max_workers, len(subreddits)))
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    self.get_top_posts_by_rating, subreddit, limit, min_score, min_ratio,
+                    min_comments, min_body_length, max_body_length, time_filter
+                ): subreddit
+                for subreddit in subreddits
+            }
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    posts = future.result()
+                except Exception as e:
+                    print(f"Error fetching r/{futures[future]}: {e}")
+                    continue
+                for post in posts:
+                    pool.setdefault(post.id, post)
+        
+        result = sorted(pool.values(), key=lambda x: x.score, reverse=True)[:limit]
+        print(f"Merged {len(pool)} candidates from {len(subreddits)} subreddits, keeping {len(result)}")
         
         return result
     
-    def _parse_post(self, post_data: Dict) -> Dict:
+    def _parse_post(self, post_data: Dict) -> Post:
         """
         Parse raw Reddit post data into a standardized format.
         
@@ -253,40 +458,23 @@ class RedditPostExtractor:
             post_data: Raw post data from Reddit API
         
         Returns:
-            Standardized post dictionary with relevant fields
-        """
-        return {
-            'id': post_data.get('id'),
-            'title': post_data.get('title'),
-            'author': post_data.get('author'),
-            'score': post_data.get('score', 0),
-            'upvote_ratio': post_data.get('upvote_ratio', 0.0),
-            'num_comments': post_data.get('num_comments', 0),
-            'url': post_data.get('url'),
-            'permalink': f"https://reddit.com{post_data.get('permalink', '')}",
-            'created_utc': datetime.fromtimestamp(post_data.get('created_utc', 0)),
-            'subreddit': post_data.get('subreddit'),
-            'is_self': post_data.get('is_self', False),
-            'selftext': post_data.get('selftext', ''),
-            'domain': post_data.get('domain'),
-            'over_18': post_data.get('over_18', False),
-            'spoiler': post_data.get('spoiler', False),
-            'stickied': post_data.get('stickied', False)
-        }
+            Post record with the relevant fields
+        """
+        return Post.from_api(post_data)
     
-    def print_posts_summary(self, posts: List[Dict]):
+    def print_posts_summary(self, posts: List[Post]):
         """
         Print a formatted summary of the filtered posts.
         
         Args:
-            posts: List of post dictionaries to display
+            posts: List of posts to display
         """
         print(f"\nFound {len(posts)} posts meeting the criteria:\n")
         
         for i, post in enumerate(posts, 1):
-            print(f"{i}. {post['title']}")
-            print(f"   Author: u/{post['author']}")
-            print(f"   Score: {post['score']} | Ratio: {post['upvote_ratio']:.2f} | Comments: {post['num_comments']}")
-            print(f"   URL: {post['permalink']}")
-            print(f"   Created: {post['created_utc'].strftime('%Y-%m-%d %H:%M:%S')}")
+            print(f"{i}. {post.title}")
+            print(f"   Author: u/{post.author}")
+            print(f"   Score: {post.score} | Ratio: {post.upvote_ratio:.2f} | Comments: {post.num_comments}")
+            print(f"   URL: {post.permalink}")
+            print(f"   Created: {post.created_utc.strftime('%Y-%m-%d %H:%M:%S')}")
             print()
@@ -0,0 +1,96 @@
+"""
+Compact record for a Reddit post.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+
+class Post:
+    """
+    A Reddit post as returned by the listing endpoints.
+
+    Uses __slots__ instead of a per-post dict so that large candidate pools stay small in
+    memory. The rarely used `permalink` and `created_utc` values are derived on access from
+    the raw API fields.
+    """
+
+    __slots__ = (
+        'id', 'title', 'author', 'score', 'upvote_ratio', 'num_comments', 'url',
+        'subreddit', 'is_self', 'selftext', 'domain', 'over_18', 'spoiler', 'stickied',
+        'permalink_path', 'created_timestamp',
+    )
+
+    def __init__(self, id: str, title: str = '', author: Optional[str] = None, score: int = 0,
+                 upvote_ratio: float = 0.0, num_comments: int = 0, url: Optional[str] = None,
+                 subreddit: Optional[str] = None, is_self: bool = False, selftext: str = '',
+                 domain: Optional[str] = None, over_18: bool = False, spoiler: bool = False,
+                 stickied: bool = False, permalink_path: str = '', created_timestamp: float = 0.0):
+        self.id = id
+        self.title = title
+        self.author = author
+        self.score = score
+        self.upvote_ratio = upvote_ratio
+        self.num_comments = num_comments
+        self.url = url
+        self.subreddit = subreddit
+        self.is_self = is_self
+        self.selftext = selftext
+        self.domain = domain
+        self.over_18 = over_18
+        self.spoiler = spoiler
+        self.stickied = stickied
+        self.permalink_path = permalink_path
+        self.created_timestamp = created_timestamp
+
+    @classmethod
+    def from_api(cls, post_data: Dict[str, Any]) -> "Post":
+        """
+        Build a post from the `data` object of a Reddit listing child.
+
+        Args:
+            post_data: Raw post data from Reddit API
+        """
+        return cls(
+            id=post_data.get('id'),
+            title=post_data.get('title'),
+            author=post_data.get('author'),
+            score=post_data.get('score', 0),
+            upvote_ratio=post_data.get('upvote_ratio', 0.0),
+            num_comments=post_data.get('num_comments', 0),
+            url=post_data.get('url'),
+            subreddit=post_data.get('subreddit'),
+            is_self=post_data.get('is_self', False),
+            selftext=post_data.get('selftext', ''),
+            domain=post_data.get('domain'),
+            over_18=post_data.get('over_18', False),
+            spoiler=post_data.get('spoiler', False),
+            stickied=post_data.get('stickied', False),
+            permalink_path=post_data.get('permalink', ''),
+            created_timestamp=post_data.get('created_utc', 0),
+        )
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Post":
+        """Rebuild a post from the output of `to_dict`."""
+        return cls(**{field: data[field] for field in cls.__slots__ if field in data})
+
+    @property
+    def permalink(self) -> str:
+        return f"https://reddit.com{self.permalink_path}"
+
+    @property
+    def created_utc(self) -> datetime:
+        return datetime.fromtimestamp(self.created_timestamp)
+
+    @property
+    def fullname(self) -> str:
+        """Fullname used by listing cursors, e.g. `t3_abc123`."""
+        return f"t3_{self.id}"
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-serializable copy of the raw fields."""
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return f"Post(id={self.id!r}, subreddit={self.subreddit!r}, score={self.score})"
@@ -0,0 +1,30 @@
+"""
+Retry policy with capped, jittered exponential backoff.
+"""
+
+import random
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 5, base_delay: float = 5.0, max_delay: float = 120.0):
+        """
+        Args:
+            max_attempts: Total number of attempts, including the first one
+            base_delay: Backoff before the second attempt, doubled for every later attempt
+            max_delay: Upper bound for a single backoff
+        """
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def can_retry(self, attempts_made: int) -> bool:
+        return attempts_made < self.max_attempts
+
+    def delay(self, attempts_made: int) -> float:
+        """
+        Seconds to wait after `attempts_made` failed attempts. Uses full jitter, i.e. a
+        uniform draw below the capped exponential backoff, so retries of many posts that
+        failed together do not hit the same source at the same time.
+        """
+        ceiling = min(self.max_delay, self.base_delay * (2 ** max(attempts_made - 1, 0)))
+        return random.uniform(0, ceiling)
@@ -1,41 +1,270 @@
 import dropbox as dbx
+import concurrent.futures
+import hashlib
 import os
 import time
-from typing import List
+from typing import Dict, List, Optional
+from helpers.retryPolicy import RetryPolicy
+
+# Dropbox's content_hash splits a file into 4 MB blocks and hashes the block hashes.
+CONTENT_HASH_BLOCK_SIZE = 4 * 1024 * 1024
+FINISH_BATCH_LIMIT = 1000
+# Partial downloads and writes in progress, left behind if a run was interrupted.
+TEMP_SUFFIXES = (".part", ".tmp")
+
+
+def content_hash(file_path: str) -> str:
+    """Hash of a local file computed the same way as Dropbox's `content_hash`."""
+    block_hashes = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while True:
+            block = f.read(CONTENT_HASH_BLOCK_SIZE)
+            if not block:
+                break
+            block_hashes.update(hashlib.sha256(block).digest())
+    return block_hashes.hexdigest()
+
+
+def is_uploadable(folder_path: str, file_name: str) -> bool:
+    """Whether `batch_upload_files` uploads a folder entry: regular files that are not hidden or temporary."""
+    return (not file_name.startswith(".") and not file_name.endswith(TEMP_SUFFIXES)
+            and os.path.isfile(os.path.join(folder_path, file_name)))
+
 
 class DropboxUploader:
-    def __init__(self, chunk_size_mb=8):
+    def __init__(self, chunk_size_mb=8, max_workers: int = 4, retry_policy: Optional[RetryPolicy] = None):
+        """
+        Args:
+            chunk_size_mb: Size of one upload request
+            max_workers: Number of files uploaded concurrently by `batch_upload_files`
+            retry_policy: Backoff for a chunk that failed to upload (default: 5 attempts)
+        """
 
         self.client = dbx.Dropbox(
             app_key=os.getenv("DROPBOX_APP_KEY"),
             app_secret=os.getenv("DROPBOX_APP_SECRET"),
             oauth2_refresh_token=os.getenv("DROPBOX_REFRESH_TOKEN")
         )
-        self.folder_path = os.getenv("DROPBOX_ROOT_FOLDER")
-        self.chunk_size = chunk_size_mb * 1024 * 1024
-    
-    def upload_file(self, file_path: str, file_name: str):
+        self.folder_path = os.getenv("DROPBOX_ROOT_FOLDER") or ""
         if not self.folder_path.startswith('/'):
             self.folder_path = '/' + self.folder_path
-        dropbox_path = self.folder_path.rstrip('/') + '/' + file_name
+        self.chunk_size = chunk_size_mb * 1024 * 1024
+        self.max_workers = max_workers
+        self.retry_policy = retry_policy or RetryPolicy(max_attempts=5, base_delay=1.0, max_delay=30.0)
+
+    def dropbox_path(self, file_name: str) -> str:
+        return self.folder_path.rstrip('/') + '/' + file_name
+
+    def upload_file(self, file_path: str, file_name: str):
+        dropbox_path = self.dropbox_path(file_name)
+        file_size = os.path.getsize(file_path)
+
+        if file_size <= self.chunk_size:
+            with open(file_path, "rb") as f:
+                data = f.read()
+            self._with_retries(lambda: self.client.files_upload(data, dropbox_path, mode=dbx.files.WriteMode('overwrite')))
+            return
+
+        finish = self.upload_session(file_path, file_name, close=False)
+        self._with_retries(lambda: self.client.files_upload_session_finish(b"", finish.cursor, finish.commit))
+
+    def upload_session(self, file_path: str, file_name: str, close: bool = True) -> dbx.files.UploadSessionFinishArg:
+        """
+        Send a file through an upload session without committing it.
+
+        A chunk that fails is retried with backoff. If Dropbox reports a different offset
+        than expected, e.g. because a timed-out request did arrive, the upload continues
+        from the offset Dropbox has instead of restarting the file.
+
+        Args:
+            file_path: Local file
+            file_name: Name of the file in the Dropbox folder
+            close: Close the session after the last chunk, as `files_upload_session_finish_batch_v2` requires
+
+        Returns:
+            The cursor and commit info needed to finish the session
+        """
         file_size = os.path.getsize(file_path)
-        
+        commit = dbx.files.CommitInfo(path=self.dropbox_path(file_name), mode=dbx.files.WriteMode('overwrite'))
+
         with open(file_path, "rb") as f:
-            if file_size <= self.chunk_size:
-                self.client.files_upload(f.read(), dropbox_path, mode=dbx.files.WriteMode('overwrite'))
-            else:
-                session = self.client.files_upload_session_start(f.read(self.chunk_size))
-                cursor = dbx.files.UploadSessionCursor(session_id=session.session_id, offset=f.tell())
-                commit = dbx.files.CommitInfo(path=dropbox_path, mode=dbx.files.WriteMode('overwrite'))
-                
-                while f.tell() < file_size:
-                    if (file_size - f.tell()) <= self.chunk_size:
-                        self.client.files_upload_session_finish(f.read(self.chunk_size), cursor, commit)
-                        break
-                    else:
-                        self.client.files_upload_session_append_v2(f.read(self.chunk_size), cursor)
-                        cursor.offset = f.tell()
-    
-    def batch_upload_files(self, folder_path: str):
-        for file in os.listdir(folder_path):
-            self.upload_file(f"{folder_path}/{file}", file)
+            first_chunk = f.read(self.chunk_size)
+            session = self._with_retries(lambda: self.client.files_upload_session_start(
+                first_chunk, close=close and len(first_chunk) >= file_size
+            ))
+            cursor = dbx.files.UploadSessionCursor(session_id=session.session_id, offset=len(first_chunk))
+
+            attempts = 0
+            while cursor.offset < file_size:
+                f.seek(cursor.offset)
+                chunk = f.read(self.chunk_size)
+                last = cursor.offset + len(chunk) >= file_size
+                try:
+                    self.client.files_upload_session_append_v2(chunk, cursor, close=close and last)
+                    cursor.offset += len(chunk)
+                    attempts = 0
+                except dbx.exceptions.ApiError as e:
+                    if not (hasattr(e.error, 'is_incorrect_offset') and e.error.is_incorrect_offset()):
+                        raise
+                    cursor.offset = e.error.get_incorrect_offset().correct_offset
+                    print(f"Resuming {file_name} at byte {cursor.offset}")
+                except (dbx.exceptions.InternalServerError, dbx.exceptions.RateLimitError, OSError) as e:
+                    attempts += 1
+                    if not self.retry_policy.can_retry(attempts):
+                        raise
+                    delay = getattr(e, 'backoff', None) or self.retry_policy.delay(attempts)
+                    print(f"Chunk at byte {cursor.offset} of {file_name} failed, retrying in {delay:.1f}s: {e}")
+                    time.sleep(delay)
+
+        return dbx.files.UploadSessionFinishArg(cursor=cursor, commit=commit)
+
+    def open_stream(self, file_name: str) -> "StreamingUpload":
+        """Start an upload whose content is written piece by piece, e.g. while it is encoded."""
+        return StreamingUpload(self, file_name)
+
+    def remote_hashes(self) -> Dict[str, str]:
+        """`content_hash` of every file in the Dropbox folder, keyed by lower-cased name."""
+        hashes = {}
+        try:
+            result = self.client.files_list_folder(self.folder_path.rstrip('/'))
+        except dbx.exceptions.ApiError as e:
+            if e.error.is_path() and e.error.get_path().is_not_found():
+                return hashes
+            raise
+
+        while True:
+            for entry in result.entries:
+                if isinstance(entry, dbx.files.FileMetadata):
+                    hashes[entry.name.lower()] = entry.content_hash
+            if not result.has_more:
+                return hashes
+            result = self.client.files_list_folder_continue(result.cursor)
+
+    def batch_upload_files(self, folder_path: str) -> Dict[str, str]:
+        """
+        Upload every file in a local folder, skipping files whose content is already in
+        Dropbox. Files are uploaded concurrently and committed together in batches.
+        Hidden files and leftover `.part`/`.tmp` files are not uploaded.
+
+        Returns:
+            File name -> "uploaded", "skipped" or "failed"
+        """
+        file_names = sorted(name for name in os.listdir(folder_path) if is_uploadable(folder_path, name))
+        remote = self.remote_hashes()
+        statuses = {}
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            local = dict(zip(file_names, executor.map(lambda name: content_hash(f"{folder_path}/{name}"), file_names)))
+            to_upload = []
+            for file_name in file_names:
+                if remote.get(file_name.lower()) == local[file_name]:
+                    statuses[file_name] = "skipped"
+                else:
+                    to_upload.append(file_name)
+
+            futures = {
+                executor.submit(self.upload_session, f"{folder_path}/{file_name}", file_name): file_name
+                for file_name in to_upload
+            }
+            finished: List[tuple] = []
+            for future in concurrent.futures.as_completed(futures):
+                file_name = futures[future]
+                try:
+                    finished.append((file_name, future.result()))
+                except Exception as e:
+                    statuses[file_name] = "failed"
+                    print(f"Failed to upload {file_name}: {e}")
+
+        for i in range(0, len(finished), FINISH_BATCH_LIMIT):
+            batch = finished[i:i + FINISH_BATCH_LIMIT]
+            result = self._with_retries(lambda: self.client.files_upload_session_finish_batch_v2([entry for _, entry in batch]))
+            for (file_name, _), entry in zip(batch, result.entries):
+                if entry.is_success():
+                    statuses[file_name] = "uploaded"
+                else:
+                    statuses[file_name] = "failed"
+                    print(f"Failed to commit {file_name}: {entry.get_failure()}")
+
+        counts = {status: sum(1 for s in statuses.values() if s == status) for status in ("uploaded", "skipped", "failed")}
+        print(f"Uploaded {counts['uploaded']} files, skipped {counts['skipped']} already in Dropbox, {counts['failed']} failed")
+        return statuses
+
+    def _with_retries(self, request):
+        attempts = 0
+        while True:
+            try:
+                return request()
+            except (dbx.exceptions.InternalServerError, dbx.exceptions.RateLimitError, OSError) as e:
+                attempts += 1
+                if not self.retry_policy.can_retry(attempts):
+                    raise
+                delay = getattr(e, 'backoff', None) or self.retry_policy.delay(attempts)
+                print(f"Dropbox request failed, retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+
+
+class StreamingUpload:
+    """
+    Upload session fed incrementally. Data is buffered to whole chunks and each chunk is
+    appended as soon as it is full; `finish` sends the rest and commits the file.
+    """
+
+    def __init__(self, uploader: DropboxUploader, file_name: str):
+        self.uploader = uploader
+        self.client = uploader.client
+        self.file_name = file_name
+        self.commit = dbx.files.CommitInfo(path=uploader.dropbox_path(file_name), mode=dbx.files.WriteMode('overwrite'))
+        self.buffer = bytearray()
+        self.cursor: Optional[dbx.files.UploadSessionCursor] = None
+        self.aborted = False
+
+    def write(self, data: bytes):
+        self._check_open()
+        self.buffer += data
+        while len(self.buffer) >= self.uploader.chunk_size:
+            chunk = bytes(self.buffer[:self.uploader.chunk_size])
+            del self.buffer[:self.uploader.chunk_size]
+            self._send(chunk)
+
+    def finish(self) -> dbx.files.FileMetadata:
+        self._check_open()
+        chunk = bytes(self.buffer)
+        self.buffer.clear()
+        if self.cursor is None:
+            return self.uploader._with_retries(lambda: self.client.files_upload(chunk, self.commit.path, mode=self.commit.mode))
+        return self.uploader._with_retries(lambda: self.client.files_upload_session_finish(chunk, self.cursor, self.commit))
+
+    def abort(self):
+        """
+        Give up on the upload: drop the buffer and refuse further writes. Dropbox has no call
+        to delete an upload session; one that is never finished is never committed and
+        expires on its own, so a retry must open a new stream rather than reuse this one.
+        """
+        if self.aborted:
+            return
+        self.aborted = True
+        self.buffer = bytearray()
+        if self.cursor is not None:
+            print(f"Abandoned the upload session of {self.file_name} at byte {self.cursor.offset}")
+        self.cursor = None
+
+    def _check_open(self):
+        if self.aborted:
+            raise ValueError(f"The upload of {self.file_name} was aborted; open a new stream to retry")
+
+    def _send(self, chunk: bytes):
+        if self.cursor is None:
+            session = self.uploader._with_retries(lambda: self.client.files_upload_session_start(chunk))
+            self.cursor = dbx.files.UploadSessionCursor(session_id=session.session_id, offset=len(chunk))
+            return
+
+        try:
+            self.uploader._with_retries(lambda: self.client.files_upload_session_append_v2(chunk, self.cursor))
+        except dbx.exceptions.ApiError as e:
+            # Only the current chunk is still in memory, so the upload can only move on if
+            # Dropbox already has all of it, i.e. a retried request had in fact arrived.
+            if not (hasattr(e.error, 'is_incorrect_offset') and e.error.is_incorrect_offset()
+                    and e.error.get_incorrect_offset().correct_offset == self.cursor.offset + len(chunk)):
+                raise
+        self.cursor.offset += len(chunk)
+
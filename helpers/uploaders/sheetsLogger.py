@@ -11,9 +11,13 @@ Format:
 
 import gspread
 from google.oauth2.service_account import Credentials
+import atexit
 import json
 import os
+import threading
+import time
 from datetime import datetime
+from typing import Optional
 
 
 class SheetsLogger:
@@ -30,6 +34,21 @@ class SheetsLogger:
     def get_ids_set(self):
         return set([row[1] for row in self.sheet.get_all_values()[1:]])
     
+    def get_ids_since(self, row_offset: int):
+        """
+        Read the post IDs of the data rows after the first `row_offset` ones.
+        
+        Only the ID column of the new rows is downloaded. Blank rows are returned as
+        empty strings so the caller can keep counting rows.
+        """
+        try:
+            values = self.sheet.get(f"B{row_offset + 2}:B")
+        except gspread.exceptions.APIError as e:
+            if "exceeds grid limits" in str(e):
+                return []
+            raise
+        return [row[0] if row else "" for row in values]
+    
     def format_data(self, post_id: str, post_title: str, post_url: str, post_score: int):
         return [
             datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
@@ -45,11 +64,150 @@ class SheetsLogger:
     def append_row(self, post_id: str, post_title: str, post_url: str, post_score: int):
         self.sheet.append_row(self.format_data(post_id, post_title, post_url, post_score))
 
-    
-    
-
-
+    def pending_ids(self):
+        """Post IDs of rows accepted by `append_row` that are not in the sheet yet."""
+        return []
 
 
 
 
+class BufferedSheetsLogger(SheetsLogger):
+    """
+    SheetsLogger that never blocks the caller on Google.
+    
+    Rows are appended to a local write-ahead log (one JSON row per line) and flushed to the
+    sheet with `append_rows` by a background thread once `batch_size` rows are pending or
+    `flush_interval` seconds have passed. The log is only trimmed after the sheet accepted the
+    batch, so rows from a failed flush or a crashed run are re-sent on the next flush.
+    Delivery is at-least-once: a crash between a successful flush and the log rewrite can
+    duplicate that batch in the sheet.
+    """
+    
+    def __init__(self, wal_path: Optional[str] = None, batch_size: int = 20, flush_interval: float = 30.0, max_retry_delay: float = 300.0):
+        super().__init__()
+        self.wal_path = wal_path or os.getenv("SHEETS_WAL_PATH", ".tokbot/sheets_wal.jsonl")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retry_delay = max_retry_delay
+        self.failed_flushes = 0
+        self.next_flush_at = 0.0
+        
+        wal_dir = os.path.dirname(self.wal_path)
+        if wal_dir:
+            os.makedirs(wal_dir, exist_ok=True)
+        
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self.pending = self._replay_wal()
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
+        
+        self._flusher = threading.Thread(target=self._run_flusher, name="sheets-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+    
+    def append_row_from_dict(self, data: dict):
+        self.append_row(**data)
+    
+    def append_row(self, post_id: str, post_title: str, post_url: str, post_score: int):
+        row = self.format_data(post_id, post_title, post_url, post_score)
+        with self._lock:
+            if self._stopped.is_set():
+                raise RuntimeError(f"Cannot log post {post_id}: the Sheets logger is closed")
+            self._wal.write(json.dumps(row) + "\n")
+            self._wal.flush()
+            os.fsync(self._wal.fileno())
+            self.pending.append(row)
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self._wake.set()
+    
+    def pending_ids(self):
+        with self._lock:
+            return [row[1] for row in self.pending]
+    
+    def flush(self) -> bool:
+        """
+        Send every pending row to the sheet in one `append_rows` call.
+        
+        Returns:
+            True if nothing is left pending
+        """
+        with self._flush_lock:
+            with self._lock:
+                if self._wal.closed:
+                    # Closed: the final flush already ran, and the rows stay in the WAL.
+                    return not self.pending
+                rows = list(self.pending)
+            if not rows:
+                return True
+            
+            try:
+                self.sheet.append_rows(rows)
+            except Exception as e:
+                self.failed_flushes += 1
+                delay = min(self.flush_interval * (2 ** self.failed_flushes), self.max_retry_delay)
+                self.next_flush_at = time.monotonic() + delay
+                print(f"Failed to flush {len(rows)} rows to Google Sheets, retrying in {delay:.0f}s: {e}")
+                return False
+            
+            self.failed_flushes = 0
+            self.next_flush_at = 0.0
+            with self._lock:
+                self.pending = self.pending[len(rows):]
+                self._rewrite_wal()
+            return not self.pending
+    
+    def close(self):
+        """
+        Stop the background flusher and make a final attempt to flush pending rows. Rows
+        appended after this raise RuntimeError instead of being lost.
+        """
+        with self._lock:
+            if self._stopped.is_set():
+                return
+            self._stopped.set()
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+        with self._lock:
+            self._wal.close()
+        if self.pending:
+            print(f"{len(self.pending)} rows are still pending in {self.wal_path} and will be sent on the next run")
+    
+    def _run_flusher(self):
+        while not self._stopped.is_set():
+            self._wake.wait(timeout=self.flush_interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            if time.monotonic() >= self.next_flush_at:
+                self.flush()
+    
+    def _replay_wal(self):
+        if not os.path.exists(self.wal_path):
+            return []
+        rows = []
+        with open(self.wal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn final line from a crash mid-write; the row was never acknowledged.
+                    continue
+        return rows
+    
+    def _rewrite_wal(self):
+        tmp_path = self.wal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for row in self.pending:
+                f.write(json.dumps(row) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._wal.close()
+        os.replace(tmp_path, self.wal_path)
+        self._wal = open(self.wal_path, "a", encoding="utf-8")
@@ -0,0 +1,116 @@
+"""
+Local index of Reddit post IDs that have already been turned into videos.
+
+The Google Sheet stays the source of truth. The index mirrors its ID column in a SQLite
+database and only reads rows appended since the last sync, so membership checks never
+touch the network.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+from helpers.uploaders.sheetsLogger import SheetsLogger
+
+
+class UsedPostIndex:
+    def __init__(self, sheets_logger: Optional[SheetsLogger] = None, db_path: Optional[str] = None, sync_interval: float = 300.0):
+        """
+        Open (or create) the local index and bring it up to date with the sheet.
+
+        Args:
+            sheets_logger: Logger whose sheet is mirrored. If None, the index is purely local.
+            db_path: Path of the SQLite database (default: USED_POSTS_DB_PATH or .tokbot/used_posts.db)
+            sync_interval: Minimum number of seconds between two syncs triggered by `maybe_sync`
+        """
+        self.sheets_logger = sheets_logger
+        self.db_path = db_path or os.getenv("USED_POSTS_DB_PATH", ".tokbot/used_posts.db")
+        self.sync_interval = sync_interval
+        self.last_sync = 0.0
+        self._lock = threading.Lock()
+
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS used_ids (post_id TEXT PRIMARY KEY)")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.commit()
+
+        self.ids = {row[0] for row in self.conn.execute("SELECT post_id FROM used_ids")}
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'synced_rows'").fetchone()
+        self.synced_rows = int(row[0]) if row else 0
+
+        if self.sheets_logger is not None:
+            self.sync()
+
+    def __contains__(self, post_id: str) -> bool:
+        return post_id in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def sync(self) -> int:
+        """
+        Pull the IDs of rows appended to the sheet since the last sync.
+
+        Returns:
+            Number of sheet rows read
+        """
+        if self.sheets_logger is None:
+            return 0
+
+        with self._lock:
+            new_ids = self.sheets_logger.get_ids_since(self.synced_rows)
+            self.synced_rows += len(new_ids)
+            self._insert(post_id for post_id in new_ids if post_id)
+            # Rows still buffered by the logger (e.g. in the WAL of a BufferedSheetsLogger) are
+            # used too; they are not counted as synced rows until they reach the sheet.
+            self._insert(self.sheets_logger.pending_ids())
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('synced_rows', ?)",
+                (str(self.synced_rows),),
+            )
+            self.conn.commit()
+            self.last_sync = time.monotonic()
+
+        return len(new_ids)
+
+    def maybe_sync(self) -> int:
+        """Sync only if `sync_interval` seconds have passed since the last sync."""
+        if time.monotonic() - self.last_sync < self.sync_interval:
+            return 0
+        return self.sync()
+
+    def add(self, post_id: str):
+        """
+        Mark a post as used locally, ahead of its row reaching the sheet.
+
+        Args:
+            post_id: Reddit post ID
+        """
+        with self._lock:
+            self._insert([post_id])
+            self.conn.commit()
+
+    def rebuild(self) -> int:
+        """Drop the local copy and re-read the whole sheet."""
+        with self._lock:
+            self.conn.execute("DELETE FROM used_ids")
+            self.conn.execute("DELETE FROM meta WHERE key = 'synced_rows'")
+            self.conn.commit()
+            self.ids = set()
+            self.synced_rows = 0
+        return self.sync()
+
+    def close(self):
+        self.conn.close()
+
+    def _insert(self, post_ids: Iterable[str]):
+        post_ids = [post_id for post_id in post_ids if post_id not in self.ids]
+        if post_ids:
+            self.conn.executemany("INSERT OR IGNORE INTO used_ids (post_id) VALUES (?)", [(post_id,) for post_id in post_ids])
+            self.ids.update(post_ids)
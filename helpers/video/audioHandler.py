@@ -6,14 +6,48 @@ import os
 import requests
 import json
 from sseclient import SSEClient
-import base64
-import subprocess
+import binascii
+import re
+import wave
+import concurrent.futures
+from typing import Callable, Dict, List, Optional, Tuple
+from helpers.video.ttsCache import TTSCache
+from helpers.video.wordTimings import WordTimings
+
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.!?])\s+')
+# Words whose trailing period does not end a sentence ("Mr. Smith", "approx. 5 miles").
+ABBREVIATIONS = {
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "etc", "approx",
+    "lt", "sgt", "capt", "gen", "col", "inc", "ltd", "co", "dept", "est", "fig", "vol",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+}
+INITIALISM = re.compile(r'(?:[a-z]\.)+[a-z]?')
 
 class VoiceGenerator:
-    def __init__(self):
+    def __init__(self, cache: Optional[TTSCache] = None, chunk_chars: Optional[int] = None, max_workers: int = 4, chunk_retries: int = 2, export_srt: Optional[bool] = None):
+        """
+        Args:
+            cache: TTS cache to use (default: a TTSCache configured from the environment)
+            chunk_chars: Transcripts longer than this are split at sentence boundaries and the
+                         chunks synthesized in parallel (default: TTS_CHUNK_CHARS, 0 disables)
+            max_workers: Maximum number of chunks synthesized at the same time
+            chunk_retries: Number of times a failed chunk is retried on its own
+            export_srt: Also write an `.srt` file next to the audio (default: TTS_EXPORT_SRT)
+        """
         self.api_key = os.getenv("CARTESIA_API_KEY")
         self.voice_id = os.getenv("CARTESIA_VOICE_ID")
         self.base_url = "https://api.cartesia.ai"
+        self.model_id = "sonic-2"
+        self.output_format = {
+            "container": "raw",
+            "encoding": "pcm_s16le",
+            "sample_rate": 44100
+        }
+        self.cache = cache if cache is not None else TTSCache()
+        self.chunk_chars = chunk_chars if chunk_chars is not None else int(os.getenv("TTS_CHUNK_CHARS", "0"))
+        self.max_workers = max_workers
+        self.chunk_retries = chunk_retries
+        self.export_srt = export_srt if export_srt is not None else os.getenv("TTS_EXPORT_SRT", "false").lower() == "true"
         
         if not self.api_key:
             raise ValueError("CARTESIA_API_KEY environment variable is required")
@@ -24,27 +58,238 @@ class VoiceGenerator:
         """
         Generate audio from transcript using Cartesia TTS API.
         
+        Audio already synthesized for the same transcript, voice, model and output format
+        is served from the TTS cache without calling the API. Transcripts longer than
+        `chunk_chars` are synthesized as parallel sentence chunks and stitched back together.
+        Word timings are saved next to the audio as `.words.json`; an `.srt` export is
+        only written when `export_srt` is enabled.
+        
         Args:
             transcript: Text to convert to speech
             output_path: Path to save the audio file
         """
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        
+        chunks = self.split_transcript(transcript, self.chunk_chars) if self.chunk_chars else [transcript]
+        
+        if len(chunks) > 1:
+            audio_bytes, timestamps = self._generate_chunked(chunks, output_path)
+        else:
+            audio_bytes, timestamps = self._generate_single(transcript, output_path)
+        
+        if audio_bytes:
+            print(f"Audio saved to: {output_path}")
+            
+            if timestamps:
+                word_timings = WordTimings.from_cartesia(timestamps)
+                word_timings.save(output_path.replace(".wav", ".words.json"))
+                if self.export_srt:
+                    self.generate_srt_from_timestamps(timestamps, output_path.replace(".wav", ".srt"))
+            
+            return output_path
+        else:
+            os.remove(output_path)
+            print("No audio data received")
+            return None
+
+    def _generate_single(self, transcript: str, output_path: str) -> Tuple[int, List[Dict]]:
+        """Synthesize the transcript in one request, streaming it to the WAV file and the cache."""
+        cache_key = self.cache.key(transcript, self.voice_id, self.model_id, self.output_format)
+        cached = self.cache.get(cache_key)
+        
+        if cached is not None:
+            pcm, timestamps = cached
+            with self._open_wav(output_path) as wav_file:
+                wav_file.writeframes(pcm)
+            print(f"TTS cache hit for {output_path}")
+            return len(pcm), timestamps
+        
+        cache_writer = self.cache.open_writer(cache_key)
+        try:
+            with self._open_wav(output_path) as wav_file:
+                def write_chunk(chunk: bytes):
+                    wav_file.writeframesraw(chunk)
+                    cache_writer.write(chunk)
+                
+                timestamps = self._synthesize(transcript, write_chunk)
+        except Exception:
+            cache_writer.abort()
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        
+        if cache_writer.size:
+            cache_writer.commit(timestamps)
+        else:
+            cache_writer.abort()
+        return cache_writer.size, timestamps
+
+    def _generate_chunked(self, chunks: List[str], output_path: str) -> Tuple[int, List[Dict]]:
+        """
+        Synthesize transcript chunks on a bounded thread pool and stitch them in order.
+        
+        Each chunk's word timestamps are shifted by the duration of the audio before it,
+        so the stitched timestamps match the stitched audio exactly.
+        """
+        bytes_per_second = 2 * self.output_format["sample_rate"]
+        audio_bytes = 0
+        timestamps = []
+        
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_workers, len(chunks))) as executor:
+                futures = [executor.submit(self._synthesize_chunk, chunk) for chunk in chunks]
+                
+                with self._open_wav(output_path) as wav_file:
+                    for future in futures:
+                        pcm, chunk_timestamps = future.result()
+                        offset = audio_bytes / bytes_per_second
+                        timestamps.extend(self._shift_timestamps(chunk_timestamps, offset))
+                        wav_file.writeframesraw(pcm)
+                        audio_bytes += len(pcm)
+        except Exception:
+            if os.path.exists(output_path):
+                os.remove(output_path)
+            raise
+        
+        print(f"Stitched {len(chunks)} TTS chunks into {output_path}")
+        return audio_bytes, timestamps
+
+    def _synthesize_chunk(self, transcript: str) -> Tuple[bytes, List[Dict]]:
+        """Synthesize one chunk through the cache, retrying it on its own if it fails."""
+        cache_key = self.cache.key(transcript, self.voice_id, self.model_id, self.output_format)
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        last_error = None
+        for attempt in range(self.chunk_retries + 1):
+            audio_chunks = []
+            try:
+                timestamps = self._synthesize(transcript, audio_chunks.append)
+            except Exception as e:
+                last_error = e
+                print(f"TTS chunk failed (attempt {attempt + 1}/{self.chunk_retries + 1}): {e}")
+                continue
+            
+            pcm = b''.join(audio_chunks)
+            if pcm:
+                self.cache.put(cache_key, pcm, timestamps)
+            return pcm, timestamps
+        
+        raise Exception(f"Failed to synthesize chunk after {self.chunk_retries + 1} attempts. Last error: {str(last_error)}")
+
+    @staticmethod
+    def split_transcript(transcript: str, max_chars: int, min_chars: Optional[int] = None) -> List[str]:
+        """
+        Split a transcript at sentence boundaries into chunks of at most `max_chars`
+        characters. A single sentence longer than `max_chars` becomes its own chunk.
+        Periods after abbreviations and initials ("Mr. Smith", "U.S. army") are not
+        treated as boundaries, and a final chunk shorter than `min_chars` is joined to the
+        previous one, so no chunk is too short to be read with natural prosody.
+        
+        Args:
+            transcript: Text to split
+            max_chars: Target maximum chunk length
+            min_chars: Minimum length of the last chunk (default: a quarter of `max_chars`)
+            
+        Returns:
+            List of chunks in order
+        """
+        if min_chars is None:
+            min_chars = max_chars // 4
+        
+        sentences = []
+        for piece in SENTENCE_BOUNDARY.split(transcript.strip()):
+            if not piece:
+                continue
+            if sentences and VoiceGenerator._ends_with_abbreviation(sentences[-1]):
+                sentences[-1] = f"{sentences[-1]} {piece}"
+            else:
+                sentences.append(piece)
+        
+        chunks = []
+        current = ""
+        
+        for sentence in sentences:
+            if current and len(current) + 1 + len(sentence) > max_chars:
+                chunks.append(current)
+                current = sentence
+            else:
+                current = f"{current} {sentence}" if current else sentence
+        
+        if current:
+            if chunks and len(current) < min_chars:
+                chunks[-1] = f"{chunks[-1]} {current}"
+            else:
+                chunks.append(current)
+        
+        return chunks
+
+    @staticmethod
+    def _ends_with_abbreviation(sentence: str) -> bool:
+        """Whether the period ending `sentence` belongs to an abbreviation or initial."""
+        if not sentence.endswith("."):
+            return False
+        word = sentence.rsplit(None, 1)[-1].rstrip(".").lstrip("(\"'").lower()
+        if word in ABBREVIATIONS:
+            return True
+        # Single-letter initials ("J. K."), but not the pronoun "I" ending a sentence.
+        if len(word) == 1 and word.isalpha() and word != "i":
+            return True
+        return bool(INITIALISM.fullmatch(word + "."))
+
+    @staticmethod
+    def _shift_timestamps(timestamps_list: List[Dict], offset: float) -> List[Dict]:
+        """Copy of Cartesia word timestamps moved `offset` seconds later."""
+        if not offset:
+            return timestamps_list
+        shifted = []
+        for timestamp_data in timestamps_list:
+            shifted.append({
+                **timestamp_data,
+                'start': [start + offset for start in timestamp_data.get('start', [])],
+                'end': [end + offset for end in timestamp_data.get('end', [])],
+            })
+        return shifted
+
+    def _open_wav(self, output_path: str) -> wave.Wave_write:
+        """
+        Open a WAV file matching the requested PCM output format. The header's length fields
+        are patched when the file is closed, so audio can be appended as it arrives.
+        """
+        wav_file = wave.open(output_path, 'wb')
+        wav_file.setnchannels(1)
+        wav_file.setsampwidth(2)
+        wav_file.setframerate(self.output_format["sample_rate"])
+        return wav_file
+
+    def _synthesize(self, transcript: str, on_audio: Callable[[bytes], None]) -> List[Dict]:
+        """
+        Stream speech for a transcript from the Cartesia SSE endpoint.
+        
+        Each audio chunk is decoded and handed to `on_audio` as soon as it arrives, so the
+        full recording is never held in memory.
+        
+        Args:
+            transcript: Text to convert to speech
+            on_audio: Called with every chunk of raw PCM audio, in order
+            
+        Returns:
+            List of word timestamp dictionaries
+        """
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Cartesia-Version": "2025-04-16"
         }
         
         payload = {
-            "model_id": "sonic-2",
+            "model_id": self.model_id,
             "transcript": transcript,
             "voice": {
                 "mode": "id",
                 "id": self.voice_id
             },
-            "output_format": {
-                "container": "raw",
-                "encoding": "pcm_s16le",
-                "sample_rate": 44100
-            },
+            "output_format": self.output_format,
             "language": "en",
             "add_timestamps": True
         }
@@ -60,7 +305,6 @@ class VoiceGenerator:
             raise Exception(f"Error: {response.status_code} - {response.text}")
         
         client = SSEClient(response)
-        audio_chunks = []
         timestamps = []
         
         for event in client.events():
@@ -73,38 +317,14 @@ class VoiceGenerator:
             elif event.event == "chunk":
                 data = json.loads(event.data)
                 if "data" in data:
-                    audio_data = base64.b64decode(data["data"])
-                    audio_chunks.append(audio_data)
+                    # A new bytes object per chunk, not a reused buffer: `_synthesize_chunk`
+                    # keeps every chunk until it joins them for the cache.
+                    on_audio(binascii.a2b_base64(data["data"]))
             
             elif event.event == "done":
                 break
         
-        if audio_chunks:
-            os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            tmp_raw_path = output_path.replace(".wav", ".pcm")
-            with open(tmp_raw_path, 'wb') as f:
-                f.write(b''.join(audio_chunks))
-
-            subprocess.run([
-                "ffmpeg", "-y",
-                "-f", "s16le",
-                "-ar", "44100",
-                "-ac", "1",
-                "-i", tmp_raw_path,
-                output_path
-            ], check=True)
-
-            os.remove(tmp_raw_path)
-            print(f"Audio saved to: {output_path}")
-            
-            if timestamps:
-                srt_path = output_path.replace(".wav", ".srt")
-                self.generate_srt_from_timestamps(timestamps, srt_path)
-            
-            return output_path
-        else:
-            print("No audio data received")
-            return None
+        return timestamps
 
     def generate_srt_from_timestamps(self, timestamps_list, output_path: str):
         """
@@ -1,66 +1,56 @@
-import yt_dlp
 import ffmpeg
 import random
-from typing import Optional
+from typing import Optional, Tuple
+import math
 import os
-import time
-import concurrent.futures
+from helpers.video.streamResolver import get_stream_resolver
+from helpers.video.footageLibrary import FootageLibrary, TIKTOK_CROP_FILTER
+
+class FootageFetchError(Exception):
+    """Every footage source failed for this attempt; the clip can be retried later."""
+
 
 class YtClipFetcher:
-    def __init__(self, output_path: str, url: Optional[str] = None):
-        
+    def __init__(self, output_path: str, url: Optional[str] = None, max_attempts: int = 3):
+        """
+        Args:
+            output_path: Path to write the clip to
+            url: Preferred source URL, tried before FOOTAGE_LINKS
+            max_attempts: Number of sources tried per `fetch_clip` call before giving up
+        """
         self.output_path = output_path
         self.video_stream_url = url
         self.video_duration = None
         self.footages = os.getenv("FOOTAGE_LINKS").split(",")
+        self.library = FootageLibrary(sources=self.footages) if os.getenv("FOOTAGE_LIBRARY_DIR") else None
+        self.resolver = get_stream_resolver()
+        self.source_url = None
+        self.video_width = None
+        self.video_height = None
+        self.max_attempts = max_attempts
 
 
-    def fetch_stream_url(self):
-        ydl_opts = {
-            'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]',
-            'merge_output_format': 'mp4',
-            'quiet': True
-        }
-        
-        urls_to_try = [self.video_stream_url] if self.video_stream_url else []
+    def fetch_stream_url(self, exclude: Optional[set] = None):
+        urls_to_try = [self.video_stream_url] if self.video_stream_url and not self.source_url else []
         
         if self.footages:
             urls_to_try.extend(self.footages)
         
-        seen = set()
+        seen = set(exclude or ())
         urls_to_try = [url for url in urls_to_try if not (url in seen or seen.add(url))]
         
-        last_error = None
+        if not urls_to_try:
+            raise FootageFetchError("No footage sources left to try")
         
-        for url in urls_to_try:
-            try:
-                with concurrent.futures.ThreadPoolExecutor() as executor:   
-                    future = executor.submit(yt_dlp.YoutubeDL(ydl_opts).extract_info, url, download=False)
-                    info = future.result(timeout=60)
-                    video = info['entries'][0] if 'entries' in info else info
-                    formats = video.get('formats', [])
-                    candidates = [f for f in formats if f.get('ext') == 'mp4' and f.get('height') and f['height'] <= 720 and f.get('url')]
-
-                    candidates.sort(key=lambda x: x['height'], reverse=True)
-
-                if candidates:
-                    self.video_stream_url = candidates[0]['url']
-                else:
-                    self.video_stream_url = video.get('url')
-                self.video_duration = video.get('duration')
-                return 
-            except Exception as e:
-                error_str = str(e)
-                if "SABR streaming" in error_str or "missing a url" in error_str:
-                    print(f"SABR streaming issue detected for {url}, trying next URL...")
-                    continue
-                else:
-                    last_error = e
-                    continue
-        
-        raise Exception(f"Failed to fetch footage from all available URLs. Last error: {str(last_error)}")
+        self.source_url, stream = self.resolver.resolve(urls_to_try)
+        self.video_stream_url = stream['url']
+        self.video_duration = stream.get('duration')
+        self.video_width = stream.get('width')
+        self.video_height = stream.get('height')
 
     def get_video_dimensions(self):
+        if self.video_width and self.video_height:
+            return int(self.video_width), int(self.video_height)
         try:
             probe = ffmpeg.probe(self.video_stream_url)
             video_info = next(s for s in probe['streams'] if s['codec_type'] == 'video')
@@ -70,35 +60,70 @@ class YtClipFetcher:
         except Exception as e:
             return 1920, 1080
 
+    def resolve_clip_source(self, clip_duration: float, exclude: Optional[set] = None) -> Tuple[str, float, bool]:
+        """
+        Choose the footage input for a clip without cutting it, for renderers that read the
+        footage directly.
+        
+        Args:
+            clip_duration: Clip length in seconds
+            exclude: Source URLs that already failed and should not be streamed from
+        
+        Returns:
+            Tuple of (input path or stream URL, start time in seconds, whether the input
+            still needs the 9:16 crop)
+        """
+        if self.library is not None and self.library.has_footage():
+            try:
+                path, start_time = self.library.pick_clip(clip_duration)
+                return path, start_time, False
+            except Exception as e:
+                print(f"Footage library has no usable clip, streaming from YouTube instead: {e}")
+        
+        self.fetch_stream_url(exclude=exclude)
+        if not self.video_duration:
+            return self.video_stream_url, 0, True
+        start_time, _ = self.dynamic_duration(int(math.ceil(clip_duration)) + 1, int(self.video_duration))
+        return self.video_stream_url, start_time, True
+
     def fetch_clip(self, tiktok_crop: bool = False, clip_duration: Optional[int] = None, start_time: Optional[str] = None, end_time: Optional[str] = None):
-        self.fetch_stream_url()
+        if tiktok_crop and clip_duration and self.library is not None and self.library.has_footage():
+            try:
+                self.library.clip(self.output_path, clip_duration)
+                return
+            except Exception as e:
+                print(f"Footage library clip failed, streaming from YouTube instead: {e}")
         
-        if clip_duration and self.video_duration:
-            start_time, end_time = self.dynamic_duration(clip_duration+1, self.video_duration)
-            duration = clip_duration
-        elif start_time and end_time:
-            start_time = self.time_to_seconds(start_time)
-            duration = self.time_to_seconds(end_time) - start_time + 1
-        else:
+        if not clip_duration and not (start_time and end_time):
             raise ValueError("Either clip_duration or start_time and end_time must be provided")
         
+        failed_sources = set()
         last_error = None
         
-        for attempt in range(5):
+        for attempt in range(self.max_attempts):
+            try:
+                self.fetch_stream_url(exclude=failed_sources)
+            except Exception as e:
+                last_error = last_error or e
+                break
+            
+            if clip_duration and self.video_duration:
+                clip_start, _ = self.dynamic_duration(clip_duration+1, self.video_duration)
+                duration = clip_duration
+            elif start_time and end_time:
+                clip_start = self.time_to_seconds(start_time)
+                duration = self.time_to_seconds(end_time) - clip_start + 1
+            else:
+                raise ValueError("Either clip_duration or start_time and end_time must be provided")
+            
             try:
-                stream = ffmpeg.input(self.video_stream_url, ss=start_time)
+                stream = ffmpeg.input(self.video_stream_url, ss=clip_start)
 
                 if tiktok_crop:
-                    filter_str = (
-                        "crop='if(gt(iw/ih,9/16),ih*9/16,iw)':'if(gt(iw/ih,9/16),ih,iw*16/9)':"
-                        "'(iw-if(gt(iw/ih,9/16),ih*9/16,iw))/2':'(ih-if(gt(iw/ih,9/16),ih,iw*16/9))/2',"
-                        "scale=1080:1920"
-                    )
-            
                     stream = stream.output(
                         self.output_path, 
                         t=duration,
-                        vf=filter_str,
+                        vf=TIKTOK_CROP_FILTER,
                         **{
                             'c:v': 'libx264',
                             'crf': '18',
@@ -127,15 +152,15 @@ class YtClipFetcher:
                 
             except Exception as e:
                 last_error = e
-                
-                if attempt < 4:
-                    wait_time = 60 * (2 ** attempt)
-                    time.sleep(wait_time)
-                else:
-                    raise Exception(f"Failed to fetch clip after 5 attempts. Last error: {str(last_error)}")
-                continue
+                # The stream URL may have expired or the source may be broken: drop the cached
+                # resolution and fail over to the next source instead of waiting on this one.
+                print(f"Clipping from {self.source_url} failed, failing over to the next source: {e}")
+                self.resolver.invalidate(self.source_url)
+                failed_sources.add(self.source_url)
+                self.video_stream_url = None
+                self.source_url = None
         
-        raise Exception(f"Failed to fetch clip after 5 attempts. Last error: {str(last_error)}")
+        raise FootageFetchError(f"Failed to fetch clip from {len(failed_sources)} sources. Last error: {str(last_error)}")
     
     @staticmethod
     def time_to_seconds(time_str):
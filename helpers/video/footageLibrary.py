@@ -0,0 +1,217 @@
+"""
+Local library of pre-transcoded background footage.
+
+Every source in FOOTAGE_LINKS is downloaded once and transcoded once to 1080x1920 with a
+keyframe every `keyframe_interval` seconds. Clips are then cut from the local files with a
+keyframe-aligned seek and a stream copy, so no network access or re-encode is needed per video.
+
+Layout of the library directory:
+    - index.json: source URL -> transcoded file, duration and keyframe interval
+    - index.lock: held while index.json is updated, so concurrent builds keep each other's entries
+    - <video id>.mp4: transcoded footage
+"""
+
+import contextlib
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import ffmpeg
+import yt_dlp
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to re-reading the index before every save
+    fcntl = None
+
+TIKTOK_CROP_FILTER = (
+    "crop='if(gt(iw/ih,9/16),ih*9/16,iw)':'if(gt(iw/ih,9/16),ih,iw*16/9)':"
+    "'(iw-if(gt(iw/ih,9/16),ih*9/16,iw))/2':'(ih-if(gt(iw/ih,9/16),ih,iw*16/9))/2',"
+    "scale=1080:1920"
+)
+
+
+class FootageLibrary:
+    def __init__(self, library_dir: Optional[str] = None, sources: Optional[List[str]] = None, keyframe_interval: int = 2):
+        """
+        Args:
+            library_dir: Directory holding the library (default: FOOTAGE_LIBRARY_DIR or .tokbot/footage)
+            sources: Source URLs (default: FOOTAGE_LINKS)
+            keyframe_interval: Seconds between forced keyframes in the transcoded files
+        """
+        self.library_dir = library_dir or os.getenv("FOOTAGE_LIBRARY_DIR", ".tokbot/footage")
+        if sources is None:
+            sources = [url for url in os.getenv("FOOTAGE_LINKS", "").split(",") if url]
+        self.sources = sources
+        self.keyframe_interval = keyframe_interval
+        self.index_path = os.path.join(self.library_dir, "index.json")
+        self.lock_path = os.path.join(self.library_dir, "index.lock")
+        self._lock = threading.Lock()
+
+        os.makedirs(self.library_dir, exist_ok=True)
+        self.index: Dict[str, Dict] = self._load_index()
+
+    def has_footage(self) -> bool:
+        return any(os.path.exists(entry["path"]) for entry in self.index.values())
+
+    def build(self, force: bool = False):
+        """
+        Download and transcode every source that is not in the library yet. A source that
+        fails is reported and skipped so one bad link does not block the rest.
+
+        Args:
+            force: Rebuild sources that are already in the library
+        """
+        for url in self.sources:
+            entry = self.index.get(url)
+            if entry and os.path.exists(entry["path"]) and not force:
+                continue
+            try:
+                self.add_source(url)
+            except Exception as e:
+                print(f"Failed to add {url} to the footage library: {e}")
+
+    def add_source(self, url: str) -> Dict:
+        """Download one source, transcode it for vertical video and add it to the index."""
+        download_dir = tempfile.mkdtemp(dir=self.library_dir)
+        try:
+            ydl_opts = {
+                'format': 'bestvideo[ext=mp4][height<=1080]/best[ext=mp4]/best',
+                'outtmpl': os.path.join(download_dir, '%(id)s.%(ext)s'),
+                'noplaylist': True,
+                'playlist_items': '1',
+                'quiet': True,
+            }
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=True)
+                video = info['entries'][0] if 'entries' in info else info
+                raw_path = ydl.prepare_filename(video)
+
+            output_path = os.path.join(self.library_dir, f"{video['id']}.mp4")
+            tmp_path = os.path.join(download_dir, f"{video['id']}.transcoded.mp4")
+            (
+                ffmpeg
+                .input(raw_path)
+                .output(
+                    tmp_path,
+                    vf=TIKTOK_CROP_FILTER,
+                    **{
+                        'c:v': 'libx264',
+                        'crf': '18',
+                        'preset': 'fast',
+                        'force_key_frames': f'expr:gte(t,n_forced*{self.keyframe_interval})',
+                        'movflags': '+faststart',
+                        'an': None,
+                        'y': None,
+                    }
+                )
+                .run(quiet=True)
+            )
+            os.replace(tmp_path, output_path)
+        finally:
+            shutil.rmtree(download_dir, ignore_errors=True)
+
+        entry = {
+            "path": output_path,
+            "duration": float(ffmpeg.probe(output_path)['format']['duration']),
+            "keyframe_interval": self.keyframe_interval,
+            "width": 1080,
+            "height": 1920,
+        }
+        self._update_index(url, entry)
+        print(f"Added {url} to the footage library ({entry['duration']:.0f}s)")
+        return entry
+
+    def pick_clip(self, duration: float, source_url: Optional[str] = None) -> Tuple[str, float]:
+        """
+        Choose a random keyframe-aligned clip from the library.
+
+        Args:
+            duration: Clip length in seconds
+            source_url: Source to cut from (default: a random source long enough for the clip)
+
+        Returns:
+            Tuple of (path of the transcoded footage, start time in seconds)
+        """
+        if source_url is not None:
+            entry = self.index[source_url]
+        else:
+            candidates = [e for e in self.index.values() if e["duration"] >= duration and os.path.exists(e["path"])]
+            if not candidates:
+                raise Exception(f"No footage in the library is at least {duration}s long")
+            entry = random.choice(candidates)
+
+        interval = entry["keyframe_interval"]
+        last_start = int((entry["duration"] - duration) // interval)
+        return entry["path"], random.randint(0, max(last_start, 0)) * interval
+
+    def clip(self, output_path: str, duration: float, source_url: Optional[str] = None):
+        """
+        Cut a random clip from the library without re-encoding.
+
+        The start time is a multiple of the keyframe interval, so the seek lands exactly
+        on a keyframe and the stream can be copied as-is.
+
+        Args:
+            output_path: Path to write the clip to
+            duration: Clip length in seconds
+            source_url: Source to cut from (default: a random source long enough for the clip)
+        """
+        path, start_time = self.pick_clip(duration, source_url)
+
+        (
+            ffmpeg
+            .input(path, ss=start_time)
+            .output(output_path, t=duration, **{'c': 'copy', 'an': None, 'y': None})
+            .run(quiet=True)
+        )
+
+    def _load_index(self) -> Dict[str, Dict]:
+        if not os.path.exists(self.index_path):
+            return {}
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _update_index(self, url: str, entry: Dict):
+        """
+        Add one source to index.json. The index is re-read under a file lock before it is
+        written, so entries added by other processes since it was loaded are kept.
+        """
+        with self._lock, self._file_lock():
+            self.index = {**self._load_index(), url: entry}
+            self._save_index()
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _save_index(self):
+        fd, tmp_path = tempfile.mkstemp(dir=self.library_dir, prefix=".index-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.index, f, indent=2)
+            os.replace(tmp_path, self.index_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+if __name__ == "__main__":
+    import dotenv
+    dotenv.load_dotenv()
+    library = FootageLibrary()
+    library.build()
+    print(f"{len(library.index)} sources in {library.library_dir}")
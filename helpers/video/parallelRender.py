@@ -0,0 +1,92 @@
+"""
+Render one video in time slices across processes.
+
+moviepy pulls frames through a Python `make_frame` one at a time on a single core. Here the
+timeline is cut into frame-aligned slices, each slice is rendered without audio by its own
+process, and the slices are joined with ffmpeg's concat demuxer without re-encoding. Every
+slice is a separate encode and so starts on a keyframe. The audio is muxed once at the end.
+
+Clips are described by a builder, a module-level function that opens the clip from its
+arguments, so each worker process can rebuild the clip it renders from.
+"""
+
+import concurrent.futures
+import os
+import shutil
+import subprocess
+import tempfile
+from typing import Callable, List, Optional, Sequence, Tuple
+
+
+def render_segmented(builder: Callable, args: Sequence, output_path: str, audio_path: Optional[str] = None,
+                     workers: int = 4, codec: str = 'libx264'):
+    """
+    Render the clip returned by `builder(*args)` to `output_path` in parallel slices.
+
+    Args:
+        builder: Module-level function returning a moviepy clip with `fps` set
+        args: Picklable arguments for `builder`
+        output_path: Path of the rendered video
+        audio_path: File whose audio track is muxed into the result (default: no audio)
+        workers: Number of slices and worker processes
+        codec: Video codec of the slices
+    """
+    clip = builder(*args)
+    try:
+        duration, fps = clip.duration, clip.fps
+    finally:
+        clip.close()
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(dir=output_dir or ".")
+
+    try:
+        slices = split_timeline(duration, fps, workers)
+        segment_paths = [os.path.join(work_dir, f"segment{i:03d}.mp4") for i in range(len(slices))]
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=len(slices)) as executor:
+            futures = [
+                executor.submit(_render_segment, builder, tuple(args), start, end, fps, path, codec)
+                for (start, end), path in zip(slices, segment_paths)
+            ]
+            for future in futures:
+                future.result()
+
+        list_path = os.path.join(work_dir, "segments.txt")
+        with open(list_path, "w", encoding="utf-8") as f:
+            f.write("ffconcat version 1.0\n")
+            for path in segment_paths:
+                f.write(f"file '{os.path.basename(path)}'\n")
+
+        command = ["ffmpeg", "-y", "-hide_banner", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+        if audio_path:
+            command += ["-i", audio_path, "-map", "0:v", "-map", "1:a?", "-c:a", "aac"]
+        command += ["-c:v", "copy", "-t", f"{duration:.3f}", "-movflags", "+faststart", output_path]
+
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise Exception(f"Joining {len(segment_paths)} segments failed: {result.stderr.strip()[-500:]}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def split_timeline(duration: float, fps: float, slices: int) -> List[Tuple[float, float]]:
+    """
+    Cut `[0, duration)` into at most `slices` contiguous (start, end) ranges whose
+    boundaries fall on frame times, so no frame is dropped or repeated at a join.
+    """
+    total_frames = max(int(round(duration * fps)), 1)
+    slices = max(1, min(slices, total_frames))
+    boundaries = [total_frames * i // slices for i in range(slices + 1)]
+    times = [frame / fps for frame in boundaries[:-1]] + [duration]
+    return [(times[i], times[i + 1]) for i in range(slices)]
+
+
+def _render_segment(builder: Callable, args: Tuple, start: float, end: float, fps: float, path: str, codec: str):
+    clip = builder(*args)
+    try:
+        clip.subclip(start, end).write_videofile(path, codec=codec, fps=fps, audio=False, logger=None)
+    finally:
+        clip.close()
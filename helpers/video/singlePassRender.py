@@ -0,0 +1,293 @@
+"""
+Render a final video with a single ffmpeg encode.
+
+The background footage, the title card, the burned-in subtitles and the narration go
+through one filter graph:
+    - input 0: footage, read straight from the footage library or the resolved stream URL
+    - input 1: the title card, looped for `calculate_pic_duration` seconds
+    - input 2: the subtitles, pre-rendered to transparent PNGs and timed by a concat list
+    - input 3: the narration
+No intermediate `footage.mp4` or `compiled.mp4` is written, and the footage is decoded and
+encoded exactly once.
+"""
+
+import math
+import os
+import re
+import subprocess
+import tempfile
+import threading
+import wave
+from typing import List, Optional, Tuple
+
+from PIL import Image
+
+from helpers.uploaders.dropboxUploader import DropboxUploader
+from helpers.video.footageFetcher import FootageFetchError, YtClipFetcher
+from helpers.video.footageLibrary import TIKTOK_CROP_FILTER
+from helpers.video.subtitleGenerator import SubtitleClip, SubtitleRenderer, load_grouped_subtitles
+from helpers.video.videoEditor import VideoCompiler
+from helpers.video.wordTimings import WordTimings
+
+VIDEO_WIDTH = 1080
+VIDEO_HEIGHT = 1920
+
+# ffmpeg messages that mean the footage stream could not be opened or read. Errors about
+# the other inputs (title card, subtitle track, narration) or the encoder are not in here.
+STREAM_ERROR = re.compile(
+    r"Server returned|HTTP error|Connection (refused|reset|timed out)|timed out|"
+    r"Error in the pull function|Failed to resolve hostname|\[(https?|tls|tcp|hls) @",
+    re.IGNORECASE,
+)
+
+
+class RenderError(Exception):
+    """ffmpeg failed for a reason another footage source would not fix."""
+
+
+def is_source_error(stderr: str, source: str) -> bool:
+    """Whether ffmpeg failed because of the footage input rather than the render itself."""
+    return source in stderr or bool(STREAM_ERROR.search(stderr))
+
+
+def render_video(file_path: str, output_path: str, max_words: int = 8, max_gap: float = 1.0,
+                 word_timings: Optional[WordTimings] = None, uploader: Optional[DropboxUploader] = None,
+                 keep_local: bool = True):
+    """
+    Render an output folder (`reddit.png`, `audio.wav`, `title.txt` and word timings) into
+    the final video.
+
+    Args:
+        file_path: Output folder of the post
+        output_path: Path of the final video
+        max_words: Maximum words per subtitle group
+        max_gap: Maximum silence in seconds inside a subtitle group
+        word_timings: Word timings of the narration (default: loaded from the folder)
+        uploader: Stream the video to Dropbox as it is encoded, as a fragmented MP4 named
+                  after `output_path`
+        keep_local: When streaming, also write the video to `output_path`
+
+    Raises:
+        FootageFetchError: Every streamed footage source failed; the render can be retried later
+        RenderError: ffmpeg failed for any other reason, e.g. a bad title card or narration
+    """
+    clean_path = file_path.rstrip('/')
+    audio_path = f"{clean_path}/audio.wav"
+
+    try:
+        pic_duration = VideoCompiler.calculate_pic_duration(clean_path)
+    except Exception:
+        pic_duration = 3
+
+    with wave.open(audio_path, 'rb') as audio_file:
+        duration = audio_file.getnframes() / float(audio_file.getframerate())
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    grouped_subs = load_grouped_subtitles(clean_path, max_words, max_gap, word_timings)
+    fetcher = YtClipFetcher(output_path)
+    failed_sources = set()
+    last_error = None
+
+    with tempfile.TemporaryDirectory(dir=clean_path) as work_dir:
+        subtitle_list = write_subtitle_track(grouped_subs, pic_duration, work_dir)
+
+        for _ in range(fetcher.max_attempts):
+            try:
+                source, start_time, needs_crop = fetcher.resolve_clip_source(int(math.ceil(duration)), exclude=failed_sources)
+            except Exception as e:
+                last_error = last_error or e
+                break
+
+            command = build_render_command(
+                source, start_time, needs_crop, duration,
+                f"{clean_path}/reddit.png", pic_duration, subtitle_list, audio_path,
+                "pipe:1" if uploader is not None else output_path, fragmented=uploader is not None
+            )
+            if uploader is not None:
+                returncode, stderr = stream_render(command, uploader, os.path.basename(output_path), output_path if keep_local else None)
+            else:
+                result = subprocess.run(command, capture_output=True, text=True)
+                returncode, stderr = result.returncode, result.stderr
+            if returncode == 0:
+                return
+
+            last_error = RenderError(f"ffmpeg exited with {returncode}: {stderr.strip()[-500:]}")
+            if not needs_crop or not is_source_error(stderr, source):
+                # Library footage, or a failure in the other inputs or the encoder: another
+                # source will not help.
+                raise last_error
+
+            print(f"Rendering from {fetcher.source_url} failed, failing over to the next source: {last_error}")
+            fetcher.resolver.invalidate(fetcher.source_url)
+            failed_sources.add(fetcher.source_url)
+            fetcher.video_stream_url = None
+            fetcher.source_url = None
+
+    raise FootageFetchError(f"Failed to render from {len(failed_sources)} footage sources. Last error: {str(last_error)}")
+
+
+def build_render_command(source: str, start_time: float, needs_crop: bool, duration: float,
+                         title_path: str, pic_duration: float, subtitle_list: str,
+                         audio_path: str, output_path: str, fragmented: bool = False) -> List[str]:
+    """
+    Build the ffmpeg command line for `render_video`. A fragmented MP4 writes its header
+    first and then self-contained fragments, so it can be written to a pipe.
+    """
+    command = [
+        "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+        "-ss", str(start_time), "-t", f"{duration:.3f}", "-i", source,
+    ]
+
+    # Input seeking already starts the footage at t=0, and keeping the stream free of setpts
+    # keeps its frame rate for the encoder.
+    graph = []
+    base = "[0:v]"
+    if needs_crop:
+        graph.append(f"[0:v]{TIKTOK_CROP_FILTER}[bg]")
+        base = "[bg]"
+    next_input = 1
+
+    if pic_duration > 0:
+        command += ["-loop", "1", "-t", str(pic_duration), "-i", title_path]
+        graph.append(f"{base}[{next_input}:v]overlay=(W-w)/2:(H-h)/2:eof_action=pass[titled]")
+        base = "[titled]"
+        next_input += 1
+
+    command += ["-f", "concat", "-safe", "0", "-i", subtitle_list]
+    graph.append(f"[{next_input}:v]format=rgba[subs]")
+    graph.append(f"{base}[subs]overlay=0:0:eof_action=pass,format=yuv420p[v]")
+    next_input += 1
+
+    command += ["-i", audio_path]
+    command += [
+        "-filter_complex", ";".join(graph),
+        "-map", "[v]", "-map", f"{next_input}:a",
+        "-t", f"{duration:.3f}",
+        "-c:v", "libx264", "-crf", "18", "-preset", "fast",
+        "-c:a", "aac",
+    ]
+    if fragmented:
+        command += ["-movflags", "frag_keyframe+empty_moov+default_base_moof", "-f", "mp4"]
+    else:
+        command += ["-movflags", "+faststart"]
+    command.append(output_path)
+    return command
+
+
+def stream_render(command: List[str], uploader: DropboxUploader, file_name: str,
+                  tee_path: Optional[str] = None) -> Tuple[int, str]:
+    """
+    Run an ffmpeg command that writes to stdout and upload its output while it runs.
+    The upload is only committed if ffmpeg succeeds. Every call opens its own upload
+    session; if the render or the upload fails, the session is aborted and the partial
+    local copy removed, so a retry starts from scratch.
+
+    Returns:
+        Tuple of (ffmpeg exit code, ffmpeg stderr)
+    """
+    upload = uploader.open_stream(file_name)
+    part_path = f"{tee_path}.part" if tee_path else None
+    process = None
+    stderr_reader = None
+    stderr_chunks = []
+    tee = None
+    completed = False
+    try:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_reader.start()
+        tee = open(part_path, "wb") if part_path else None
+
+        while True:
+            data = process.stdout.read(1024 * 1024)
+            if not data:
+                break
+            upload.write(data)
+            if tee:
+                tee.write(data)
+
+        returncode = process.wait()
+        if returncode == 0:
+            upload.finish()
+            completed = True
+    finally:
+        if process is not None:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            process.stdout.close()
+        if stderr_reader is not None:
+            stderr_reader.join()
+        if tee:
+            tee.close()
+        if completed:
+            if tee:
+                os.replace(part_path, tee_path)
+        else:
+            upload.abort()
+            if part_path and os.path.exists(part_path):
+                os.remove(part_path)
+
+    return returncode, b"".join(stderr_chunks).decode("utf-8", errors="replace")
+
+
+def write_subtitle_track(subs: List[SubtitleClip], initial_position_duration: float, work_dir: str,
+                         width: int = VIDEO_WIDTH, height: int = VIDEO_HEIGHT) -> str:
+    """
+    Render every subtitle group once to a transparent PNG and write an ffmpeg concat list
+    next to them that shows each image for exactly as long as its group is spoken. Gaps
+    between groups show a blank image. Groups that straddle `initial_position_duration` are
+    split, so they move to the center at the same moment as in `add_subtitles`.
+
+    Returns:
+        Path of the concat list
+    """
+    renderer = SubtitleRenderer(width, height, os.getenv("SUBTITLE_FONT_PATH"))
+    blank_path = os.path.join(work_dir, "blank.png")
+    Image.new('RGBA', (width, height), (0, 0, 0, 0)).save(blank_path)
+
+    images = {}
+    entries: List[Tuple[str, float]] = []
+    cursor = 0.0
+
+    for text, start, end, center_position in _positioned_segments(subs, initial_position_duration):
+        start = max(start, cursor)
+        if end <= start:
+            continue
+        if start > cursor:
+            entries.append((blank_path, start - cursor))
+
+        key = (text, center_position)
+        if key not in images:
+            image_path = os.path.join(work_dir, f"sub{len(images)}.png")
+            Image.fromarray(renderer.render(text, center_position=center_position)).save(image_path)
+            images[key] = image_path
+        entries.append((images[key], end - start))
+        cursor = end
+
+    list_path = os.path.join(work_dir, "subtitles.txt")
+    with open(list_path, "w", encoding="utf-8") as f:
+        f.write("ffconcat version 1.0\n")
+        for path, length in entries:
+            f.write(f"file '{os.path.basename(path)}'\nduration {length:.3f}\n")
+        # The concat demuxer ignores the duration of the last entry, so end on a blank frame.
+        f.write(f"file '{os.path.basename(blank_path)}'\n")
+    return list_path
+
+
+def _positioned_segments(subs: List[SubtitleClip], initial_position_duration: float):
+    for sub in sorted(subs, key=lambda s: s.start):
+        if sub.start < initial_position_duration < sub.end:
+            yield sub.text, sub.start, initial_position_duration, False
+            yield sub.text, initial_position_duration, sub.end, True
+        else:
+            yield sub.text, sub.start, sub.end, sub.start >= initial_position_duration
+
+
+if __name__ == "__main__":
+    import dotenv
+    dotenv.load_dotenv()
+    render_video("output-1mhu024", "output/rendered.mp4")
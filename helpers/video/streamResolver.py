@@ -0,0 +1,173 @@
+"""
+Resolve footage source URLs to direct stream URLs, with caching and hedged lookups.
+
+yt-dlp needs tens of seconds to resolve a YouTube page to a googlevideo stream URL, but
+the signed URL it returns stays valid for hours (its `expire` query parameter). Resolved
+streams are cached on disk per source URL until shortly before they expire. On a miss, the
+first two candidate sources are looked up concurrently and whichever answers first wins.
+"""
+
+import concurrent.futures
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import yt_dlp
+
+YDL_OPTS = {
+    'format': 'bestvideo[ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]',
+    'merge_output_format': 'mp4',
+    'quiet': True
+}
+
+
+class StreamResolver:
+    def __init__(self, cache_path: Optional[str] = None, hedge: int = 2, timeout: float = 60.0,
+                 default_ttl: float = 3600.0, safety_margin: float = 900.0):
+        """
+        Args:
+            cache_path: JSON file holding resolved streams (default: STREAM_CACHE_PATH or .tokbot/stream_cache.json)
+            hedge: Number of sources looked up concurrently on a cache miss
+            timeout: Seconds to wait for a round of lookups before trying the next sources
+            default_ttl: Lifetime of a resolved URL that carries no `expire` parameter
+            safety_margin: Resolved URLs are treated as expired this many seconds early, so a
+                           clip started from the cache does not outlive its URL
+        """
+        self.cache_path = cache_path or os.getenv("STREAM_CACHE_PATH", ".tokbot/stream_cache.json")
+        self.hedge = max(1, hedge)
+        self.timeout = timeout
+        self.default_ttl = default_ttl
+        self.safety_margin = safety_margin
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=max(4, self.hedge * 2), thread_name_prefix="stream-resolver")
+        self.cache: Dict[str, Dict] = self._load_cache()
+
+    def resolve(self, urls: List[str]) -> Tuple[str, Dict]:
+        """
+        Resolve the first usable source among `urls`.
+
+        Args:
+            urls: Candidate source URLs in order of preference
+
+        Returns:
+            Tuple of (source URL, stream entry with `url`, `duration`, `width`, `height`, `expires_at`)
+        """
+        for url in urls:
+            entry = self.get_cached(url)
+            if entry is not None:
+                return url, entry
+
+        last_error = None
+        for i in range(0, len(urls), self.hedge):
+            batch = urls[i:i + self.hedge]
+            futures = {self._executor.submit(self._lookup, url): url for url in batch}
+            pending = set(futures)
+            deadline = time.monotonic() + self.timeout
+
+            while pending:
+                done, pending = concurrent.futures.wait(
+                    pending, timeout=max(deadline - time.monotonic(), 0),
+                    return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                if not done:
+                    last_error = TimeoutError(f"Timed out resolving {', '.join(futures[f] for f in pending)}")
+                    break
+                for future in done:
+                    try:
+                        return futures[future], future.result()
+                    except Exception as e:
+                        last_error = e
+                        print(f"Failed to resolve {futures[future]}: {e}")
+
+        raise Exception(f"Failed to fetch footage from all available URLs. Last error: {str(last_error)}")
+
+    def get_cached(self, source_url: str) -> Optional[Dict]:
+        with self._lock:
+            entry = self.cache.get(source_url)
+        if entry is not None and entry["expires_at"] - self.safety_margin > time.time():
+            return entry
+        return None
+
+    def invalidate(self, source_url: str):
+        """Forget a resolved stream, e.g. after the stream URL stopped working."""
+        with self._lock:
+            if self.cache.pop(source_url, None) is not None:
+                self._save_cache()
+
+    def _lookup(self, url: str) -> Dict:
+        """Resolve one source with yt-dlp and cache the result."""
+        info = yt_dlp.YoutubeDL(YDL_OPTS).extract_info(url, download=False)
+        video = info['entries'][0] if 'entries' in info else info
+        formats = video.get('formats', [])
+        candidates = [f for f in formats if f.get('ext') == 'mp4' and f.get('height') and f['height'] <= 720 and f.get('url')]
+        candidates.sort(key=lambda x: x['height'], reverse=True)
+
+        chosen = candidates[0] if candidates else video
+        stream_url = chosen.get('url')
+        if not stream_url:
+            raise Exception(f"Resolved format for {url} is missing a url")
+
+        entry = {
+            "url": stream_url,
+            "duration": video.get('duration'),
+            "width": chosen.get('width'),
+            "height": chosen.get('height'),
+            "expires_at": self._expiry(stream_url),
+        }
+        with self._lock:
+            self.cache[url] = entry
+            self._save_cache()
+        return entry
+
+    def _expiry(self, stream_url: str) -> float:
+        expire = parse_qs(urlparse(stream_url).query).get('expire')
+        if expire:
+            try:
+                return float(expire[0])
+            except ValueError:
+                pass
+        return time.time() + self.default_ttl
+
+    def _load_cache(self) -> Dict[str, Dict]:
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_cache(self):
+        """
+        Write the cache through a temporary file unique to this call, so render processes
+        saving at the same time never replace each other's half-written file. The cache is
+        only an optimization, so a failed save is reported and otherwise ignored.
+        """
+        directory = os.path.dirname(self.cache_path)
+        tmp_path = None
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory or ".", prefix=".stream_cache-", suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(self.cache, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Failed to save the stream cache to {self.cache_path}: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+
+_default_resolver = None
+_default_resolver_lock = threading.Lock()
+
+
+def get_stream_resolver() -> StreamResolver:
+    """Process-wide resolver shared by every YtClipFetcher."""
+    global _default_resolver
+    with _default_resolver_lock:
+        if _default_resolver is None:
+            _default_resolver = StreamResolver()
+        return _default_resolver
@@ -1,9 +1,13 @@
+import bisect
 import cv2
 import numpy as np
 import re
+from collections import OrderedDict
 from typing import List, Optional
 from PIL import Image, ImageDraw, ImageFont
 from helpers.video.videoEditor import VideoCompiler
+from helpers.video.parallelRender import render_segmented
+from helpers.video.wordTimings import WordTimings
 import os
 from moviepy.editor import VideoFileClip, VideoClip
 
@@ -23,6 +27,8 @@ class SubtitleClip:
         self.start = start
         self.end = end
 
+SUBTITLE_STRIP = re.compile(r'<[^>]+>|[.\[\]:;()\-\n]')
+
 def parse_srt_time(time_str: str) -> float:
     time_part, ms_part = time_str.strip().split(',')
     h, m, s = map(float, time_part.split(':'))
@@ -43,7 +49,7 @@ def load_srt(file_path: str) -> List[SubtitleClip]:
                 start_str, end_str = lines[1].split('-->')
                 start = parse_srt_time(start_str)
                 end = parse_srt_time(end_str)
-                text = re.sub(r'<[^>]+>|[.\[\]:;()\-\n]', '', ' '.join(lines[2:]).strip())
+                text = SUBTITLE_STRIP.sub('', ' '.join(lines[2:]).strip())
                 text = text.lower()
                 
                 if text:
@@ -82,6 +88,35 @@ def group_subtitles(subs: List[SubtitleClip], max_words=8, max_gap=1.0) -> List[
     
     return grouped
 
+def group_words(timings: WordTimings, max_words=8, max_gap=1.0) -> List[SubtitleClip]:
+    """
+    Group word-level timings into subtitle clips, breaking at `max_words` words or at a
+    silence longer than `max_gap` seconds.
+    """
+    grouped = []
+    current = []
+    group_start = 0.0
+    group_end = 0.0
+    
+    for start, end, word in timings:
+        text = SUBTITLE_STRIP.sub('', word).strip().lower()
+        if not text:
+            continue
+        
+        if current and (len(current) >= max_words or start - group_end > max_gap):
+            grouped.append(SubtitleClip(' '.join(current), group_start, group_end))
+            current = []
+        
+        if not current:
+            group_start = start
+        current.append(text)
+        group_end = end
+    
+    if current:
+        grouped.append(SubtitleClip(' '.join(current), group_start, group_end))
+    
+    return grouped
+
 class SubtitleRenderer:
     def __init__(self, width: int, height: int, font_path: str):
         self.width = width
@@ -145,71 +180,176 @@ class SubtitleRenderer:
         
         return np.array(img)
 
+class SubtitleSprite:
+    """
+    A rendered subtitle cropped to its bounding box, with the colour premultiplied by alpha
+    so blending is one multiply-add per channel in integer arithmetic.
+    """
+    __slots__ = ('x', 'y', 'rgba', 'premultiplied', 'inverse_alpha', 'nbytes')
+    
+    def __init__(self, x: int, y: int, rgba: np.ndarray):
+        self.x = x
+        self.y = y
+        self.rgba = rgba
+        alpha = rgba[:, :, 3:4].astype(np.uint16)
+        self.premultiplied = rgba[:, :, :3] * alpha
+        self.inverse_alpha = 255 - alpha
+        self.nbytes = rgba.nbytes + self.premultiplied.nbytes + self.inverse_alpha.nbytes
+    
+    @classmethod
+    def from_frame(cls, frame: np.ndarray) -> Optional["SubtitleSprite"]:
+        ys, xs = np.nonzero(frame[:, :, 3])
+        if len(ys) == 0:
+            return None
+        y1, y2, x1, x2 = ys.min(), ys.max() + 1, xs.min(), xs.max() + 1
+        return cls(int(x1), int(y1), np.ascontiguousarray(frame[y1:y2, x1:x2]))
+    
+    def blend_into(self, frame: np.ndarray):
+        """Alpha-blend the sprite into the RGB channels of `frame` in place."""
+        height, width = self.rgba.shape[:2]
+        region = frame[self.y:self.y + height, self.x:self.x + width, :3]
+        # 255 * 255 + 127 still fits in uint16, so the blend never leaves integer arithmetic.
+        blended = region * self.inverse_alpha
+        blended += self.premultiplied
+        blended += 127
+        blended //= 255
+        region[...] = blended
+
 class SubtitleOverlay:
-    def __init__(self, subs: List[SubtitleClip], width: int, height: int, font_path: str, initial_position_duration: float = 0.0):
+    def __init__(self, subs: List[SubtitleClip], width: int, height: int, font_path: str,
+                 initial_position_duration: float = 0.0, max_cache_bytes: int = 64 * 1024 * 1024):
         self.subs = sorted(subs, key=lambda x: x.start)
+        self.starts = [sub.start for sub in self.subs]
+        self.width = width
+        self.height = height
         self.renderer = SubtitleRenderer(width, height, font_path)
         self.initial_position_duration = initial_position_duration
-        self.cache = {}
+        self.max_cache_bytes = max_cache_bytes
+        self.cache: "OrderedDict[tuple, Optional[SubtitleSprite]]" = OrderedDict()
+        self.cache_bytes = 0
     
-    def get_frame(self, t: float) -> Optional[np.ndarray]:
-        for sub in self.subs:
-            if sub.start <= t < sub.end:
-                center_position = t >= self.initial_position_duration
-                
-                cache_key = f"{sub.text}_{center_position}"
-                
-                if cache_key not in self.cache:
-                    self.cache[cache_key] = self.renderer.render(sub.text, center_position=center_position)
-                
-                return self.cache[cache_key]
+    def active(self, t: float) -> Optional[SubtitleClip]:
+        i = bisect.bisect_right(self.starts, t) - 1
+        if i >= 0 and t < self.subs[i].end:
+            return self.subs[i]
         return None
+    
+    def get_sprite(self, t: float) -> Optional[SubtitleSprite]:
+        sub = self.active(t)
+        if sub is None:
+            return None
+        
+        key = (sub.text, t >= self.initial_position_duration)
+        if key in self.cache:
+            self.cache.move_to_end(key)
+            return self.cache[key]
+        
+        sprite = SubtitleSprite.from_frame(self.renderer.render(sub.text, center_position=key[1]))
+        self.cache[key] = sprite
+        self.cache_bytes += sprite.nbytes if sprite is not None else 0
+        while self.cache_bytes > self.max_cache_bytes and len(self.cache) > 1:
+            _, evicted = self.cache.popitem(last=False)
+            self.cache_bytes -= evicted.nbytes if evicted is not None else 0
+        return sprite
+    
+    def blend(self, frame: np.ndarray, t: float) -> np.ndarray:
+        """
+        Return the RGB frame with the subtitle active at `t` blended in. Only the
+        subtitle's bounding box is touched; the input frame is never modified.
+        """
+        sprite = self.get_sprite(t)
+        if sprite is None:
+            return frame
+        
+        # The copy cannot be skipped: moviepy's reader returns frames built with np.frombuffer
+        # over ffmpeg's output, which are read-only, and hands the same array back when a
+        # frame is requested twice, so blending in place would fail or blend it twice.
+        result = np.array(frame[:, :, :3], dtype=np.uint8)
+        sprite.blend_into(result)
+        return result
+    
+    def get_frame(self, t: float) -> Optional[np.ndarray]:
+        """Full-frame RGBA image of the subtitle active at `t`."""
+        sprite = self.get_sprite(t)
+        if sprite is None:
+            return None
+        
+        frame = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        height, width = sprite.rgba.shape[:2]
+        frame[sprite.y:sprite.y + height, sprite.x:sprite.x + width] = sprite.rgba
+        return frame
 
 
-def add_subtitles(file_path: str, output_path: str, max_words: int = 8, max_gap: float = 1.0):
+def load_grouped_subtitles(file_path: str, max_words: int = 8, max_gap: float = 1.0,
+                           word_timings: Optional[WordTimings] = None) -> List[SubtitleClip]:
+    """
+    Group the subtitles of an output folder, preferring word-level timings.
+    
+    Uses `word_timings` if given, else `audio.words.json`, and falls back to parsing
+    `audio.srt` for folders produced before word timings were saved.
+    """
+    clean_path = file_path.rstrip('/')
+    words_path = f"{clean_path}/audio.words.json"
+    
+    if word_timings is None and os.path.exists(words_path):
+        word_timings = WordTimings.load(words_path)
     
+    if word_timings is not None:
+        return group_words(word_timings, max_words=max_words, max_gap=max_gap)
+    
+    return group_subtitles(load_srt(f"{clean_path}/audio.srt"), max_words=max_words, max_gap=max_gap)
 
+def build_subtitled_clip(file_path: str, max_words: int = 8, max_gap: float = 1.0,
+                         word_timings: Optional[WordTimings] = None) -> Optional[VideoClip]:
+    """`compiled.mp4` of an output folder with its subtitles burned in, or None without subtitles."""
     initial_position_duration = VideoCompiler.calculate_pic_duration(file_path)
-    srt_path = f"{file_path}/audio.srt"
     font_path = os.getenv("SUBTITLE_FONT_PATH")
 
-    video = VideoFileClip(f"{file_path}/compiled.mp4")
-    subtitles = load_srt(srt_path)
+    grouped_subs = load_grouped_subtitles(file_path, max_words, max_gap, word_timings)
     
-    if not subtitles:
-        print("No subtitles found")
-        return
+    if not grouped_subs:
+        return None
     
-    grouped_subs = group_subtitles(subtitles, max_words=max_words, max_gap=max_gap)
+    video = VideoFileClip(f"{file_path}/compiled.mp4")
     overlay = SubtitleOverlay(grouped_subs, video.w, video.h, font_path, initial_position_duration)
     
     def make_frame_with_subtitles(t):
-        video_frame = video.get_frame(t)
-        
-        subtitle_frame = overlay.get_frame(t)
-        
-        if subtitle_frame is not None:
-            if video_frame.shape[2] == 3:
-                video_rgba = np.zeros((video.h, video.w, 4), dtype=np.uint8)
-                video_rgba[:, :, :3] = video_frame
-                video_rgba[:, :, 3] = 255
-            else:
-                video_rgba = video_frame
-            
-            alpha = subtitle_frame[:, :, 3:4] / 255.0
-            result = video_rgba[:, :, :3] * (1 - alpha) + subtitle_frame[:, :, :3] * alpha
-            return result.astype(np.uint8)
-        
-        return video_frame
+        return overlay.blend(video.get_frame(t), t)
     
-    final_video = VideoClip(make_frame=make_frame_with_subtitles, duration=video.duration)
+    final_video = VideoClip(make_frame=make_frame_with_subtitles, duration=video.duration).set_fps(video.fps)
     
     if video.audio is not None:
         final_video = final_video.set_audio(video.audio)
     
-    final_video.write_videofile(output_path, codec='libx264', audio_codec='aac', fps=video.fps)
+    # Closing the returned clip also closes the readers of compiled.mp4.
+    close_clip = final_video.close
+    def close():
+        close_clip()
+        video.close()
+    final_video.close = close
+    
+    return final_video
+
+def add_subtitles(file_path: str, output_path: str, max_words: int = 8, max_gap: float = 1.0,
+                  word_timings: Optional[WordTimings] = None, workers: Optional[int] = None):
+    """
+    Args:
+        workers: Number of processes rendering time slices in parallel (default: RENDER_WORKERS, 1)
+    """
+    if workers is None:
+        workers = int(os.getenv("RENDER_WORKERS", "1"))
+    
+    if not load_grouped_subtitles(file_path, max_words, max_gap, word_timings):
+        print("No subtitles found")
+        return
+    
+    if workers > 1:
+        render_segmented(build_subtitled_clip, (file_path, max_words, max_gap, word_timings), output_path,
+                         audio_path=f"{file_path.rstrip('/')}/compiled.mp4", workers=workers)
+        return
     
-    video.close()
+    final_video = build_subtitled_clip(file_path, max_words, max_gap, word_timings)
+    final_video.write_videofile(output_path, codec='libx264', audio_codec='aac', fps=final_video.fps)
     final_video.close()
 
 if __name__ == "__main__":
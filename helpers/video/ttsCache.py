@@ -0,0 +1,244 @@
+"""
+Content-addressed on-disk cache for synthesized speech.
+
+Each entry is keyed by a hash of the transcript, voice, model and output format and stores
+the raw PCM next to the word timestamps returned with it:
+    - <key>.pcm: raw audio in the requested output format
+    - <key>.json: word timestamps
+Entries are evicted least-recently-used first once the cache grows past `max_bytes`.
+Audio left without its timestamps by a crash, and stray temporary files, are deleted by
+`prune` once they are older than `ORPHAN_GRACE_SECONDS`.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Files younger than this may belong to a `put` that is still writing its entry.
+ORPHAN_GRACE_SECONDS = 600
+
+
+class TTSCache:
+    def __init__(self, cache_dir: Optional[str] = None, max_bytes: Optional[int] = None):
+        """
+        Args:
+            cache_dir: Directory holding the cache (default: TTS_CACHE_DIR or .tokbot/tts_cache)
+            max_bytes: Size bound for the cache (default: TTS_CACHE_MAX_MB, 2048 MB)
+        """
+        self.cache_dir = cache_dir or os.getenv("TTS_CACHE_DIR", ".tokbot/tts_cache")
+        if max_bytes is None:
+            max_bytes = int(float(os.getenv("TTS_CACHE_MAX_MB", "2048")) * 1024 * 1024)
+        self.max_bytes = max_bytes
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    @staticmethod
+    def key(transcript: str, voice_id: str, model_id: str, output_format: Dict) -> str:
+        """Hash of everything that determines the synthesized audio."""
+        material = json.dumps(
+            {"transcript": transcript, "voice_id": voice_id, "model_id": model_id, "output_format": output_format},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[bytes, List[Dict]]]:
+        """
+        Look up an entry and mark it as recently used.
+
+        Returns:
+            (pcm, word timestamps) or None on a miss
+        """
+        pcm_path, meta_path = self._paths(key)
+        # A concurrent `put` may prune the entry at any point, so touching and reading it
+        # both count as a miss if the files are gone. Touching first makes a prune that
+        # runs during the read less likely to pick this entry.
+        try:
+            for path in (pcm_path, meta_path):
+                os.utime(path)
+            with open(meta_path, "r", encoding="utf-8") as f:
+                timestamps = json.load(f)
+            with open(pcm_path, "rb") as f:
+                pcm = f.read()
+        except (OSError, json.JSONDecodeError):
+            return None
+        return pcm, timestamps
+
+    def put(self, key: str, pcm: bytes, timestamps: List[Dict]):
+        """Store an entry, then evict old entries if the cache is over its size bound."""
+        pcm_path, meta_path = self._paths(key)
+
+        # The timestamps file is written last and marks the entry as complete.
+        self._write_atomic(pcm_path, pcm)
+        self._write_atomic(meta_path, json.dumps(timestamps).encode("utf-8"))
+
+        self.prune()
+
+    def open_writer(self, key: str) -> "CacheWriter":
+        """Start an entry whose audio is streamed in chunk by chunk."""
+        return CacheWriter(self, key)
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        """
+        List the complete entries.
+
+        Returns:
+            (key, size in bytes, last used time) tuples, least recently used first
+        """
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".json"):
+                continue
+            key = name[:-len(".json")]
+            pcm_path, meta_path = self._paths(key)
+            try:
+                size = os.path.getsize(pcm_path) + os.path.getsize(meta_path)
+                last_used = os.path.getmtime(meta_path)
+            except OSError:
+                continue
+            entries.append((key, size, last_used))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def orphans(self, min_age: float = ORPHAN_GRACE_SECONDS) -> List[str]:
+        """
+        Paths of `.pcm` files without their `.json` and of leftover temporary files, which
+        `entries` does not see, that were last modified more than `min_age` seconds ago.
+        """
+        cutoff = time.time() - min_age
+        orphans = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".pcm"):
+                if os.path.exists(path[:-len(".pcm")] + ".json"):
+                    continue
+            elif not name.endswith(".tmp"):
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    orphans.append(path)
+            except OSError:
+                continue
+        return orphans
+
+    def stats(self) -> Dict:
+        entries = self.entries()
+        orphans = self.orphans(0)
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "orphans": len(orphans),
+            "max_bytes": self.max_bytes,
+            "cache_dir": self.cache_dir,
+        }
+
+    def prune(self, max_bytes: Optional[int] = None) -> int:
+        """
+        Evict least recently used entries until the cache fits in `max_bytes`.
+
+        Args:
+            max_bytes: Size to prune down to (default: the cache's own bound)
+
+        Returns:
+            Number of entries evicted
+        """
+        limit = self.max_bytes if max_bytes is None else max_bytes
+        for path in self.orphans():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+
+        for key, size, _ in entries:
+            if total <= limit:
+                break
+            self.remove(key)
+            total -= size
+            evicted += 1
+
+        return evicted
+
+    def remove(self, key: str):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> int:
+        return self.prune(0)
+
+    def _paths(self, key: str) -> Tuple[str, str]:
+        base = os.path.join(self.cache_dir, key)
+        return f"{base}.pcm", f"{base}.json"
+
+    def _write_atomic(self, path: str, data: bytes):
+        # A temporary file per call: chunk threads and pipeline workers can store the same
+        # key at the same time.
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+
+class CacheWriter:
+    """
+    Streams audio into a pending cache entry. The entry only becomes visible to `get`
+    once `commit` has written its timestamps.
+    """
+
+    def __init__(self, cache: TTSCache, key: str):
+        self.cache = cache
+        self.key = key
+        self.pcm_path, self.meta_path = cache._paths(key)
+        self.tmp_path = f"{self.pcm_path}.{os.getpid()}.{id(self)}.tmp"
+        self.file = open(self.tmp_path, "wb")
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self, timestamps: List[Dict]):
+        self.file.close()
+        os.replace(self.tmp_path, self.pcm_path)
+        self.cache._write_atomic(self.meta_path, json.dumps(timestamps).encode("utf-8"))
+        self.cache.prune()
+
+    def abort(self):
+        self.file.close()
+        try:
+            os.remove(self.tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+if __name__ == "__main__":
+    import argparse
+    import dotenv
+    dotenv.load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Inspect or prune the TTS cache.")
+    parser.add_argument("command", choices=["stats", "prune", "clear"])
+    parser.add_argument("--max-mb", type=float, help="Size to prune down to, in MB")
+    args = parser.parse_args()
+
+    cache = TTSCache()
+    if args.command == "prune":
+        max_bytes = int(args.max_mb * 1024 * 1024) if args.max_mb is not None else None
+        print(f"Evicted {cache.prune(max_bytes)} entries")
+    elif args.command == "clear":
+        print(f"Evicted {cache.clear()} entries")
+    stats = cache.stats()
+    print(f"{stats['entries']} entries ({stats['orphans']} orphaned files), {stats['bytes'] / 1024 / 1024:.1f} MB of {stats['max_bytes'] / 1024 / 1024:.0f} MB in {stats['cache_dir']}")
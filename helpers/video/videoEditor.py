@@ -1,6 +1,7 @@
 from moviepy.editor import VideoFileClip, ImageClip, CompositeVideoClip, AudioFileClip
 import wave
 from helpers.video.footageFetcher import YtClipFetcher
+from helpers.video.parallelRender import render_segmented
 import math
 import os
 from typing import Optional
@@ -10,22 +11,25 @@ class VideoCompiler:
         self.input_file_path = input_file_path
         self.output_path = output_path
 
-    def compile_video(self):
+    def compile_video(self, workers: Optional[int] = None):
+        """
+        Args:
+            workers: Number of processes rendering time slices in parallel (default: RENDER_WORKERS, 1)
+        """
         os.makedirs(os.path.dirname(self.output_path), exist_ok=True)
-
         
-        try:
-            duration = self.calculate_pic_duration(self.input_file_path)
-        except Exception as e:
-            duration = 3
+        if workers is None:
+            workers = int(os.getenv("RENDER_WORKERS", "1"))
         
-        clean_path = self.input_file_path.rstrip('/')
-        video = VideoFileClip(f'{clean_path}/footage.mp4')
-        title = ImageClip(f'{clean_path}/reddit.png').set_start(0).set_duration(duration).set_pos(("center","center"))
-        audio = AudioFileClip(f'{clean_path}/audio.wav')
-        final_video = CompositeVideoClip([video, title])
-        final_video = final_video.set_audio(audio)
+        if workers > 1:
+            clean_path = self.input_file_path.rstrip('/')
+            render_segmented(build_compiled_clip, (self.input_file_path,), self.output_path,
+                             audio_path=f'{clean_path}/audio.wav', workers=workers)
+            return
+        
+        final_video = build_compiled_clip(self.input_file_path)
         final_video.write_videofile(self.output_path)
+        final_video.close()
     
     def get_wav_duration(self):
         clean_path = self.input_file_path.rstrip('/')
@@ -53,7 +57,31 @@ class VideoCompiler:
             title = f.read()
         words = len(title.split())
         return min(round(words * 0.25), 10.0)
+
+
+def build_compiled_clip(input_file_path: str) -> CompositeVideoClip:
+    """Footage with the title card and narration of an output folder, ready to be written."""
+    try:
+        duration = VideoCompiler.calculate_pic_duration(input_file_path)
+    except Exception as e:
+        duration = 3
+    
+    clean_path = input_file_path.rstrip('/')
+    video = VideoFileClip(f'{clean_path}/footage.mp4')
+    title = ImageClip(f'{clean_path}/reddit.png').set_start(0).set_duration(duration).set_pos(("center","center"))
+    audio = AudioFileClip(f'{clean_path}/audio.wav')
+    final_video = CompositeVideoClip([video, title]).set_audio(audio)
     
+    # CompositeVideoClip.close leaves its sources open, so close the file readers with it.
+    close_clip = final_video.close
+    def close():
+        close_clip()
+        video.close()
+        audio.close()
+    final_video.close = close
+    
+    return final_video
+
 if __name__ == "__main__":
     video_compiler = VideoCompiler(
         input_file_path="/Users/irfanfirosh/Documents/Personal projects/TokBot/output-1mfyuzf",
@@ -0,0 +1,65 @@
+"""
+Word-level timings of synthesized speech.
+
+Stored as three parallel columns (words, start times, end times in seconds) and saved as
+JSON next to the audio, e.g. `audio.words.json`.
+"""
+
+import json
+import os
+from array import array
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+
+class WordTimings:
+    __slots__ = ('words', 'starts', 'ends')
+
+    def __init__(self, words: Iterable[str] = (), starts: Iterable[float] = (), ends: Iterable[float] = ()):
+        self.words: List[str] = list(words)
+        self.starts = array('d', starts)
+        self.ends = array('d', ends)
+
+        if not (len(self.words) == len(self.starts) == len(self.ends)):
+            raise ValueError("words, starts and ends must have the same length")
+
+    @classmethod
+    def from_cartesia(cls, timestamps_list: List[Dict]) -> "WordTimings":
+        """
+        Build timings from the `word_timestamps` events returned by the Cartesia API.
+
+        Args:
+            timestamps_list: List of {'words': [...], 'start': [...], 'end': [...]} dictionaries
+        """
+        timings = cls()
+        for timestamp_data in timestamps_list:
+            words = timestamp_data.get('words', [])
+            starts = timestamp_data.get('start', [])
+            ends = timestamp_data.get('end', [])
+            count = min(len(words), len(starts), len(ends))
+            timings.words.extend(words[:count])
+            timings.starts.extend(starts[:count])
+            timings.ends.extend(ends[:count])
+        return timings
+
+    @classmethod
+    def load(cls, path: str) -> "WordTimings":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['words'], data['start'], data['end'])
+
+    def save(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'words': self.words, 'start': self.starts.tolist(), 'end': self.ends.tolist()}, f)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __iter__(self) -> Iterator[Tuple[float, float, str]]:
+        return zip(self.starts, self.ends, self.words)
+
+    @property
+    def duration(self) -> float:
+        return self.ends[-1] if self.ends else 0.0
@@ -1,7 +1,8 @@
 from generators.redditGenerator import RedditGenerator
 import dotenv
 
-dotenv.load_dotenv()
+if __name__ == "__main__":
+    dotenv.load_dotenv()
 
-redditGenerator = RedditGenerator()
-redditGenerator.upload_to_tiktok()
\ No newline at end of file
+    redditGenerator = RedditGenerator()
+    redditGenerator.upload_to_tiktok()